@@ -2,6 +2,11 @@ import logging
 import os
 
 from celery import Celery
+from celery.signals import task_postrun, task_prerun
+from kombu.exceptions import ChannelError
+from typing import Optional
+
+from backend.dbmetrics import on_task_postrun, on_task_prerun
 
 # ------------------------- #
 
@@ -21,4 +26,35 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 # Load task modules from all registered Django apps.
 app.autodiscover_tasks()
 
+# Account database usage of each task.
+task_prerun.connect(on_task_prerun)
+task_postrun.connect(on_task_postrun)
+
+# ------------------------- #
+
+def get_queue_depth(queue: Optional[str] = None) -> Optional[int]:
+    """
+    Get number of tasks waiting in broker queue using pooled broker connection.
+
+    Args:
+        queue (Optional[str], optional): queue name. Defaults to default task queue.
+
+    Returns:
+        Optional[int]: number of queued tasks, None if broker is unavailable
+    """
+
+    queue = queue or app.conf.task_default_queue
+
+    try:
+        with app.pool.acquire(block=True) as connection:
+            return connection.default_channel.queue_declare(queue=queue, passive=True).message_count
+
+    # empty queue does not exist in Redis
+    except ChannelError:
+        return 0
+
+    except Exception as error:
+        logger.warning(f"failed to get depth of queue '{queue}': {error}")
+        return None
+
 # ------------------------- #
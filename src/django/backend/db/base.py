@@ -0,0 +1,63 @@
+"""
+PostgreSQL backend with health checks of persistent connections
+and accounting of connection acquire time.
+"""
+
+from django.conf import settings
+from django.db.backends.postgresql import base
+from django.utils.asyncio import async_unsafe
+from time import perf_counter
+
+# ------------------------- #
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    Persistent connection (CONN_MAX_AGE) reused by the next request or task
+    is checked with SELECT 1 on its first use and reopened if it is broken.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+
+        self.health_check_needed = False
+
+        # opened connections and time spent to open them (seconds)
+        self.connects = 0
+        self.connect_time = 0.0
+
+    # ......................... #
+
+    def close_if_unusable_or_obsolete(self) -> None:
+        """
+        Close connection after errors or on max age exceeded,
+        kept connection is checked before the next use.
+        """
+
+        self.health_check_needed = False
+
+        super().close_if_unusable_or_obsolete()
+
+        self.health_check_needed = self.connection is not None and settings.DB_CONN_HEALTH_CHECKS
+
+    # ......................... #
+
+    @async_unsafe
+    def ensure_connection(self) -> None:
+        """
+        Check reused connection and open new one if there is no usable connection.
+        """
+
+        if self.health_check_needed:
+            self.health_check_needed = False
+
+            if not self.is_usable():
+                self.close()
+
+        if self.connection is None:
+            started = perf_counter()
+            super().ensure_connection()
+
+            self.connects += 1
+            self.connect_time += perf_counter() - started
+
+# ------------------------- #
@@ -0,0 +1,253 @@
+import asyncio
+import logging
+
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.db import connection
+from django.http import HttpRequest, HttpResponse
+from time import perf_counter
+from typing import Any, Callable, Dict, Iterator, Optional
+
+# ------------------------- #
+
+logger = logging.getLogger(__name__)
+
+# accumulated stats of requests and tasks (worker process scope)
+_totals: Dict[str, float] = dict(units=0, queries=0, db_time=0.0, connects=0, connect_time=0.0)
+
+# stats of request being processed, copied into threads running its queries
+_current: ContextVar[Optional['QueryStats']] = ContextVar('query_stats', default=None)
+
+# ------------------------- #
+
+class QueryStats:
+    """
+    Database usage of single request or task: query count, query execution time
+    and time spent to open connections (backend.db engine only).
+    """
+
+    def __init__(self) -> None:
+        self.queries = 0
+        self.db_time = 0.0
+        self.connects = 0
+        self.connect_time = 0.0
+
+    # ......................... #
+
+    def __call__(self, execute: Callable, sql: str, params: Any, many: bool, context: Dict[str, Any]) -> Any:
+        """
+        Execute wrapper accounting query count and time.
+        """
+
+        started = perf_counter()
+
+        try:
+            return execute(sql, params, many, context)
+
+        finally:
+            self.queries += 1
+            self.db_time += perf_counter() - started
+
+    # ......................... #
+
+    @contextmanager
+    def track(self) -> Iterator['QueryStats']:
+        """
+        Account queries and opened connections of the current thread connection within the block.
+
+        Yields:
+            Iterator[QueryStats]: stats
+        """
+
+        connects = getattr(connection, 'connects', 0)
+        connect_time = getattr(connection, 'connect_time', 0.0)
+
+        try:
+            with connection.execute_wrapper(self):
+                yield self
+
+        finally:
+            self.connects += getattr(connection, 'connects', 0) - connects
+            self.connect_time += getattr(connection, 'connect_time', 0.0) - connect_time
+
+    # ......................... #
+
+    def finish(self, label: str) -> Dict[str, float]:
+        """
+        Log stats and add them to the process totals.
+
+        Args:
+            label (str): request path or task name
+
+        Returns:
+            Dict[str, float]: query count, query time and connect time (ms), opened connections
+        """
+
+        stats = dict(
+            queries=self.queries,
+            db_time=self.db_time * 1000,
+            connects=self.connects,
+            connect_time=self.connect_time * 1000
+        )
+
+        logger.debug(
+            f"{label}: {stats['queries']} queries in {stats['db_time']:.2f} ms, "
+            f"{stats['connects']} connects in {stats['connect_time']:.2f} ms"
+        )
+
+        _totals['units'] += 1
+
+        for name, value in stats.items():
+            _totals[name] += value
+
+        if _totals['units'] % settings.DB_METRICS_LOG_INTERVAL == 0:
+            logger.info(f"database stats: {get_database_stats()}")
+
+        return stats
+
+# ------------------------- #
+
+@contextmanager
+def track_queries() -> Iterator[Optional[QueryStats]]:
+    """
+    Account queries of the current thread connection to the stats of request or task
+    being processed, used by code querying database outside of request thread.
+
+    Yields:
+        Iterator[Optional[QueryStats]]: stats of the current request or task, None if there is none
+    """
+
+    stats = _current.get()
+
+    if stats is None:
+        yield None
+        return
+
+    with stats.track():
+        yield stats
+
+# ------------------------- #
+
+def get_database_stats() -> Dict[str, float]:
+    """
+    Get mean database usage per request or task of the worker process.
+
+    Returns:
+        Dict[str, float]: mean query count, query time (ms), connects and connect time (ms)
+    """
+
+    units = _totals['units'] or 1
+
+    return dict(
+        (name, value / units)
+        for name, value in _totals.items()
+        if name != 'units'
+    )
+
+# ------------------------- #
+
+class DatabaseMetricsMiddleware:
+    """
+    Account database usage of each request and expose it in Server-Timing header.
+
+    Middleware works in both sync and async chains, so ASGI requests are not adapted
+    to thread by it. Under ASGI queries are accounted by `track_queries` of threads running them.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response: Callable[[HttpRequest], HttpResponse]) -> None:
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+
+        # mark instance as coroutine function for async handler
+        if self.is_async:
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    # ......................... #
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        if self.is_async:
+            return self.__acall__(request)
+
+        stats = QueryStats()
+        token = _current.set(stats)
+
+        try:
+            with stats.track():
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+            result = stats.finish(f"{request.method} {request.path}")
+
+        return self.add_timing(response, result)
+
+    # ......................... #
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponse:
+        stats = QueryStats()
+        token = _current.set(stats)
+
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+            result = stats.finish(f"{request.method} {request.path}")
+
+        return self.add_timing(response, result)
+
+    # ......................... #
+
+    def add_timing(self, response: HttpResponse, result: Dict[str, float]) -> HttpResponse:
+        """
+        Append database usage of the request to Server-Timing header.
+
+        Args:
+            response (HttpResponse): response to send
+            result (Dict[str, float]): finished stats of the request
+
+        Returns:
+            HttpResponse: response with Server-Timing header
+        """
+
+        timing = (
+            f'db;desc="{result["queries"]} queries";dur={result["db_time"]:.2f}, '
+            f'db-connect;desc="{result["connects"]} connects";dur={result["connect_time"]:.2f}'
+        )
+
+        if response.has_header('Server-Timing'):
+            timing = f"{response['Server-Timing']}, {timing}"
+
+        response['Server-Timing'] = timing
+
+        return response
+
+# ------------------------- #
+
+def on_task_prerun(task_id: str, task: Any, **kwargs) -> None:
+    """
+    Start accounting database usage of Celery task.
+    """
+
+    stats = QueryStats()
+    tracking = ExitStack()
+    tracking.enter_context(stats.track())
+
+    task.request.query_stats = (stats, tracking)
+
+# ------------------------- #
+
+def on_task_postrun(task_id: str, task: Any, **kwargs) -> None:
+    """
+    Finish accounting database usage of Celery task.
+    """
+
+    stats, tracking = getattr(task.request, 'query_stats', (None, None))
+
+    if stats is not None:
+        tracking.close()
+        stats.finish(task.name)
+
+# ------------------------- #
@@ -49,6 +49,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'backend.dbmetrics.DatabaseMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -82,14 +83,26 @@ WSGI_APPLICATION = 'backend.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.0/ref/settings/#databases
 
+# seconds to keep connection open between requests and tasks (0 closes it after each one),
+# every gunicorn worker and celery worker child process keeps its own connection
+DB_CONN_MAX_AGE = int(os.environ.get('DB_CONN_MAX_AGE', 60))
+
+# check reused connection with SELECT 1 before the first query of request or task
+DB_CONN_HEALTH_CHECKS = os.environ.get('DB_CONN_HEALTH_CHECKS', 'true').lower() == 'true'
+
+# log mean query count, query time and connect time every N requests and tasks
+DB_METRICS_LOG_INTERVAL = int(os.environ.get('DB_METRICS_LOG_INTERVAL', 1000))
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql_psycopg2',
+        # PostgreSQL backend with health checks of persistent connections
+        'ENGINE': 'backend.db',
         'NAME': os.environ['POSTGRES_DB'],
         'USER': os.environ['POSTGRES_USER'],
         'PASSWORD': os.environ['POSTGRES_PASSWORD'],
         'HOST': 'database',
-        'PORT' : 5432
+        'PORT' : 5432,
+        'CONN_MAX_AGE': DB_CONN_MAX_AGE,
     }
 }
 
@@ -140,6 +153,108 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 CELERY_RESULT_BACKEND = 'redis://redis:6379'
 CELERY_BROKER_URL = 'redis://redis:6379'
 
+# queued tasks count logged as warning by queue depth check
+CELERY_QUEUE_DEPTH_WARNING = int(os.environ.get('CELERY_QUEUE_DEPTH_WARNING', 100))
+
+# Cache settings (shared by web and celery processes)
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('CACHE_REDIS_URL', 'redis://redis:6379/1'),
+    }
+}
+
+# Response cache settings
+
+# store rendered responses in shared cache in addition to local LRU
+SHEETS_CACHE_SHARED = os.environ.get('SHEETS_CACHE_SHARED', 'true').lower() == 'true'
+SHEETS_CACHE_TIMEOUT = int(os.environ.get('SHEETS_CACHE_TIMEOUT', 3600))
+SHEETS_CACHE_LOCAL_SIZE = int(os.environ.get('SHEETS_CACHE_LOCAL_SIZE', 128))
+
+# log hit rate and latency every N requests
+SHEETS_CACHE_STATS_INTERVAL = int(os.environ.get('SHEETS_CACHE_STATS_INTERVAL', 1000))
+
+# Orders API settings
+
+SHEETS_PAGE_MAX_LIMIT = int(os.environ.get('SHEETS_PAGE_MAX_LIMIT', 1000))
+
+# rows fetched from server-side cursor and encoded at once by streaming endpoint
+SHEETS_STREAM_CHUNK_SIZE = int(os.environ.get('SHEETS_STREAM_CHUNK_SIZE', 2000))
+
+# exported file size kept in memory before spilling to disk
+SHEETS_EXPORT_SPOOL_SIZE = int(os.environ.get('SHEETS_EXPORT_SPOOL_SIZE', 16 * 1024 * 1024))
+
+# serve read endpoints by native async views (ASGI deployment)
+SHEETS_ASYNC_VIEWS = os.environ.get('SHEETS_ASYNC_VIEWS', 'false').lower() == 'true'
+
+# threads (and database connections) per process running ORM queries of async views
+SHEETS_ASYNC_DB_THREADS = int(os.environ.get('SHEETS_ASYNC_DB_THREADS', 8))
+
+# Google Sheets sync settings
+
+# delivery date format used by sheet (generic parser is used as fallback)
+SHEET_DATE_FORMAT = os.environ.get('SHEET_DATE_FORMAT', '%d.%m.%Y')
+
+# seconds before access token expiry when cached Google API client is re-authorized
+SHEET_CLIENT_TOKEN_REFRESH_MARGIN = int(os.environ.get('SHEET_CLIENT_TOKEN_REFRESH_MARGIN', 300))
+
+# rows fetched from sheet by single range request
+SHEET_SYNC_PAGE_SIZE = int(os.environ.get('SHEET_SYNC_PAGE_SIZE', 5000))
+
+# rows compared and written into database at once
+SHEET_SYNC_CHUNK_SIZE = int(os.environ.get('SHEET_SYNC_CHUNK_SIZE', 5000))
+
+# Order upsert backend: 'orm' (bulk_update_or_create) or 'copy' (PostgreSQL COPY and ON CONFLICT merge)
+SHEET_SYNC_BACKEND = os.environ.get('SHEET_SYNC_BACKEND', 'orm')
+
+# max share of stored orders allowed to be deleted by single sync
+SHEET_SYNC_MAX_DELETE_RATIO = float(os.environ.get('SHEET_SYNC_MAX_DELETE_RATIO', 0.5))
+
+# token of sheet change trigger webhook (webhook is disabled if empty)
+SHEET_SYNC_WEBHOOK_TOKEN = os.environ.get('SHEET_SYNC_WEBHOOK_TOKEN', '')
+
+# seconds to wait for further changes before triggered sync
+SHEET_SYNC_DEBOUNCE_SECONDS = int(os.environ.get('SHEET_SYNC_DEBOUNCE_SECONDS', 5))
+
+# fallback polling interval for changes missed by trigger
+SHEET_SYNC_POLL_SECONDS = int(os.environ.get('SHEET_SYNC_POLL_SECONDS', 900))
+
+# seconds the sheet sync lock is held at most (lock of crashed worker expires)
+SHEET_SYNC_LOCK_TIMEOUT = int(os.environ.get('SHEET_SYNC_LOCK_TIMEOUT', 1800))
+
+# Exchange rate settings
+
+CBR_DAILY_URL = os.environ.get('CBR_DAILY_URL', 'http://www.cbr.ru/scripts/XML_daily.asp')
+CBR_REQUEST_TIMEOUT = float(os.environ.get('CBR_REQUEST_TIMEOUT', 10))
+
+# currencies fetched from CBR feed in addition to USD
+EXCHANGE_RATE_CURRENCIES = os.environ.get('EXCHANGE_RATE_CURRENCIES', 'USD,EUR,CNY').split(',')
+
+# seconds the latest rate is kept by process before lookup in shared cache
+EXCHANGE_RATE_LOCAL_TIMEOUT = int(os.environ.get('EXCHANGE_RATE_LOCAL_TIMEOUT', 60))
+
+# Telegram Bot settings
+
+TG_BOT_API_URL = os.environ.get('TG_BOT_API_URL', 'https://api.telegram.org/bot')
+
+# token bucket rate limit for outgoing messages
+TG_BOT_MESSAGES_PER_SECOND = float(os.environ.get('TG_BOT_MESSAGES_PER_SECOND', 1))
+TG_BOT_MESSAGES_BURST = int(os.environ.get('TG_BOT_MESSAGES_BURST', 3))
+
+# retries on network errors with exponential backoff (seconds)
+TG_BOT_SEND_RETRIES = int(os.environ.get('TG_BOT_SEND_RETRIES', 3))
+TG_BOT_SEND_BACKOFF = float(os.environ.get('TG_BOT_SEND_BACKOFF', 1))
+
+# seconds between checks of new /subscribe commands
+TG_BOT_SUBSCRIBERS_POLL_SECONDS = int(os.environ.get('TG_BOT_SUBSCRIBERS_POLL_SECONDS', 60))
+
+# seconds the latest subscriber is kept by process before lookup in shared cache
+TG_BOT_SUBSCRIBER_LOCAL_TIMEOUT = int(os.environ.get('TG_BOT_SUBSCRIBER_LOCAL_TIMEOUT', 60))
+
+# seconds the notification lock is held at most (lock of crashed worker expires)
+TG_BOT_NOTIFY_LOCK_TIMEOUT = int(os.environ.get('TG_BOT_NOTIFY_LOCK_TIMEOUT', 300))
+
 # Rest framework settings
 
 REST_FRAMEWORK = {
@@ -0,0 +1,90 @@
+"""
+Parse time of CBR daily rates feed: incremental `parse_daily_rates` against full document
+parse with xmltodict of the original exchange rate task, xmltodict is installed
+from `requirements-bench.txt` (the comparison is skipped without it).
+
+Feed fixture `bench/fixtures/cbr_daily.xml` is generated, not recorded from cbr.ru: it follows
+XML_daily.asp layout (windows-1251, 43 currencies with CBR IDs, numeric codes and nominals)
+with rates derived from 60.5 RUB in 1 USD. Pass recorded response with `--feed` to measure real feed.
+
+    pip install -r requirements-bench.txt
+    python -m bench.cbr [--feed path/to/XML_daily.xml] [--number 2000]
+"""
+
+import argparse
+import io
+import os
+import timeit
+
+from decimal import Decimal
+from typing import Callable, List, Tuple
+
+from bench.utils import setup_django
+
+# ------------------------- #
+
+FEED_FIXTURE = os.path.join(os.path.dirname(__file__), 'fixtures', 'cbr_daily.xml')
+
+# CBR ID of USD used by the original task
+USD_ID = 'R01235'
+
+# ------------------------- #
+
+def parse_usd_xmltodict(data: bytes) -> Decimal:
+    """
+    Parse USD rate the way the original exchange rate task did.
+
+    Args:
+        data (bytes): XML_daily.asp response body
+
+    Returns:
+        Decimal: RUB for one USD
+    """
+
+    import xmltodict
+
+    tree = xmltodict.parse(data)
+    usd = filter(lambda x: x['@ID'] == USD_ID, tree['ValCurs']['Valute'])
+
+    return Decimal(tuple(usd)[0]['Value'].replace(',', '.'))
+
+# ------------------------- #
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--feed', default=FEED_FIXTURE, help='XML_daily.asp response body')
+    parser.add_argument('--number', type=int, default=2000, help='parses per measurement')
+    args = parser.parse_args()
+
+    setup_django()
+
+    from googlesheets.cbr import parse_daily_rates
+
+    with open(args.feed, 'rb') as file:
+        data = file.read()
+
+    parsers: List[Tuple[str, Callable[[], object]]] = [
+        ('iterparse USD', lambda: parse_daily_rates(io.BytesIO(data), ['USD'])),
+        ('iterparse USD,EUR,CNY', lambda: parse_daily_rates(io.BytesIO(data), ['USD', 'EUR', 'CNY'])),
+    ]
+
+    try:
+        usd = parse_usd_xmltodict(data)
+    except ImportError:
+        print('xmltodict is not installed (requirements-bench.txt), original parse is skipped')
+    else:
+        if parse_daily_rates(io.BytesIO(data), ['USD'])[1].get('USD') != usd:
+            raise SystemExit('parsed USD rates differ')
+
+        parsers.insert(0, ('xmltodict USD', lambda: parse_usd_xmltodict(data)))
+
+    print(f"feed {args.feed}: {len(data)} bytes")
+
+    for name, parse in parsers:
+        elapsed = timeit.timeit(parse, number=args.number) / args.number
+        print(f"{name:<22} {elapsed * 1e6:>8.0f} us")
+
+# ------------------------- #
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+"""
+HTTP load of running backend: requests per second and latency percentiles of read endpoints
+at given concurrency. Compare sync gunicorn workers (`./start-dev`) with uvicorn workers
+and async views (`./start-prod`) by running the same load against each deployment, e.g.
+
+    python -m bench.load --url http://localhost:8000 --concurrency 64 --requests 5000
+    python -m bench.load --path /sheets/get-total-price/usd --no-cache
+
+With `--no-cache` each request gets unique query string, so response cache is missed.
+"""
+
+import argparse
+import asyncio
+
+from time import perf_counter
+from typing import List, Tuple
+from urllib.parse import urlsplit
+
+# ------------------------- #
+
+DEFAULT_PATHS = (
+    '/sheets/get-aggregate-price?currency=usd&granularity=month',
+    '/sheets/get-total-price/usd',
+    '/sheets/get-accum-price/rub',
+)
+
+# ------------------------- #
+
+async def fetch(host: str, port: int, path: str) -> Tuple[int, float]:
+    """
+    Make single GET request over new connection and read the whole response.
+
+    Args:
+        host (str): server host
+        port (int): server port
+        path (str): request path with query string
+
+    Returns:
+        Tuple[int, float]: response status (0 for connection error) and latency in seconds
+    """
+
+    started = perf_counter()
+
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+    except OSError:
+        return 0, perf_counter() - started
+
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode())
+    await writer.drain()
+
+    response = await reader.read()
+    writer.close()
+
+    try:
+        code = int(response.split(b' ', 2)[1])
+    except (IndexError, ValueError):
+        code = 0
+
+    return code, perf_counter() - started
+
+# ------------------------- #
+
+def percentile(latencies: List[float], rank: float) -> float:
+    """
+    Get percentile of sorted latencies.
+
+    Args:
+        latencies (List[float]): sorted latencies
+        rank (float): percentile rank from 0 to 100
+
+    Returns:
+        float: latency in milliseconds
+    """
+
+    return latencies[min(len(latencies) - 1, int(len(latencies) * rank / 100))] * 1000
+
+# ------------------------- #
+
+async def run_load(url: str, paths: List[str], concurrency: int, requests: int, no_cache: bool) -> None:
+    """
+    Make requests cycling through paths with at most `concurrency` requests in flight and print statistics.
+
+    Args:
+        url (str): server URL
+        paths (List[str]): request paths
+        concurrency (int): number of concurrent requests
+        requests (int): total number of requests
+        no_cache (bool): add unique query parameter to every request
+    """
+
+    location = urlsplit(url)
+    host, port = location.hostname, location.port or 80
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def request(number: int) -> Tuple[int, float]:
+        path = paths[number % len(paths)]
+
+        if no_cache:
+            path += f"{'&' if '?' in path else '?'}nocache={number}"
+
+        async with semaphore:
+            return await fetch(host, port, path)
+
+    started = perf_counter()
+    results = await asyncio.gather(*(request(number) for number in range(requests)))
+    elapsed = perf_counter() - started
+
+    latencies = sorted(latency for code, latency in results if code == 200)
+    errors = len(results) - len(latencies)
+
+    if not latencies:
+        print(f"all {errors} requests failed")
+        return
+
+    print(
+        f"{url} concurrency {concurrency}: {len(latencies) / elapsed:,.0f} rps  "
+        f"p50 {percentile(latencies, 50):.0f} ms  p99 {percentile(latencies, 99):.0f} ms  errors {errors}"
+    )
+
+# ------------------------- #
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://localhost:8000', help='backend URL')
+    parser.add_argument('--path', dest='paths', action='append', help='request path, repeat for several (read endpoints by default)')
+    parser.add_argument('--concurrency', type=int, default=64, help='concurrent requests')
+    parser.add_argument('--requests', type=int, default=5000, help='total requests')
+    parser.add_argument('--no-cache', action='store_true', help='miss response cache')
+    args = parser.parse_args()
+
+    asyncio.run(run_load(args.url, args.paths or list(DEFAULT_PATHS), args.concurrency, args.requests, args.no_cache))
+
+# ------------------------- #
+
+if __name__ == '__main__':
+    main()
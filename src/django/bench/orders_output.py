@@ -0,0 +1,143 @@
+"""
+Time to first byte, total time and peak memory of orders output modes: full list,
+streamed JSON array and keyset pages. For each size orders of `bench` sheet are seeded
+and each mode is requested in a separate process with cold response cache,
+so peak RSS of the process is taken by single response. Orders of other sheets
+are returned as well, so run against empty database for exact sizes.
+
+    python -m bench.orders_output [--sizes 10000 100000 1000000] [--limit 1000]
+"""
+
+import resource
+import subprocess
+import sys
+
+from time import perf_counter
+from typing import Iterator, Tuple
+
+from bench.utils import get_parser, setup_django
+
+# ------------------------- #
+
+MODES = ('full', 'stream', 'paged')
+
+# ------------------------- #
+
+def get_peak_rss() -> float:
+    """
+    Get peak resident set size of the current process.
+
+    Returns:
+        float: peak RSS in MB
+    """
+
+    # kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+# ------------------------- #
+
+def iter_response(mode: str, limit: int) -> Iterator[bytes]:
+    """
+    Request orders with Django test client in given mode.
+
+    Args:
+        mode (str): one of `MODES`
+        limit (int): page size of paged mode
+
+    Yields:
+        Iterator[bytes]: response body parts, the first one is available at first byte
+    """
+
+    import json
+
+    from django.test import Client
+
+    client = Client()
+
+    if mode == 'full':
+        yield client.get('/sheets/get-all-orders').content
+
+    elif mode == 'stream':
+        yield from client.get('/sheets/get-all-orders/stream').streaming_content
+
+    else:
+        params = dict(limit=limit)
+
+        while True:
+            content = client.get('/sheets/get-all-orders', params).content
+            yield content
+
+            cursor = json.loads(content)['next']
+
+            if cursor is None:
+                break
+
+            params['after'] = cursor
+
+# ------------------------- #
+
+def measure_mode(mode: str, limit: int) -> Tuple[float, float, int, float, float]:
+    """
+    Read orders response in given mode.
+
+    Args:
+        mode (str): one of `MODES`
+        limit (int): page size of paged mode
+
+    Returns:
+        Tuple[float, float, int, float, float]: time to first byte, total time, response size,
+            peak RSS before and after request
+    """
+
+    from googlesheets.cache import bump_data_version
+
+    bump_data_version()
+
+    rss_before = get_peak_rss()
+    started = perf_counter()
+
+    parts = iter_response(mode, limit)
+    size = len(next(parts))
+    first_byte = perf_counter() - started
+    size += sum(len(part) for part in parts)
+
+    return first_byte, perf_counter() - started, size, rss_before, get_peak_rss()
+
+# ------------------------- #
+
+def main() -> None:
+    parser = get_parser(__doc__)
+    parser.add_argument('--limit', type=int, default=1000, help='page size of paged mode')
+    parser.add_argument('--mode', choices=MODES, help='measure single mode in the current process')
+    args = parser.parse_args()
+
+    setup_django()
+
+    if args.mode is not None:
+        first_byte, elapsed, size, rss_before, rss_after = measure_mode(args.mode, args.limit)
+        print(
+            f"{args.mode:<6} ttfb {first_byte:>7.3f} s  total {elapsed:>7.2f} s  "
+            f"{size / 2 ** 20:>8.1f} MB  peak RSS {rss_before:>6.0f} -> {rss_after:>6.0f} MB",
+            flush=True
+        )
+        return
+
+    from bench.seed import BENCH_SHEET_NAME, seed_orders
+    from googlesheets.models import SheetSource
+
+    for size in args.sizes:
+        seed_orders(size)
+
+        for mode in MODES:
+            print(f"{size:>9} rows  ", end='', flush=True)
+            subprocess.run(
+                [sys.executable, '-m', 'bench.orders_output', '--mode', mode, '--limit', str(args.limit)],
+                check=True
+            )
+
+    SheetSource.objects.filter(name=BENCH_SHEET_NAME).delete()
+
+# ------------------------- #
+
+if __name__ == '__main__':
+    main()
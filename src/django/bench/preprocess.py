@@ -0,0 +1,51 @@
+"""
+Throughput of sheet rows preprocessing: column-wise `preprocess_rows` against
+per-row preprocessing of the original sync task.
+
+    python -m bench.preprocess [--sizes 10000 100000 1000000]
+"""
+
+from decimal import Decimal
+from typing import Any, Dict, List
+
+from bench.utils import generate_records, get_parser, measure, setup_django
+
+# ------------------------- #
+
+EXCHANGE_RATE = Decimal('60.5')
+
+# ------------------------- #
+
+def preprocess_rows_per_row(rows: List[Dict[str, Any]], exchange_rate: Decimal) -> List[Dict[str, Any]]:
+    """
+    Preprocessing of the original sync task: generic date parser and current time per row.
+    """
+
+    from dateutil import parser as dtparser
+    from django.utils.timezone import now
+
+    for row in rows:
+        row['delivery_date'] = dtparser.parse(row['delivery_date'])
+        row['delivery_expired'] = (row['delivery_date'] - now().replace(tzinfo=None)).days < 0
+        row['delivery_date'] = row['delivery_date'].strftime(format="%Y-%m-%d")
+        row['price_RUB'] = float(exchange_rate) * row['price_USD']
+
+    return rows
+
+# ------------------------- #
+
+def main() -> None:
+    args = get_parser(__doc__).parse_args()
+    setup_django()
+
+    from googlesheets.sync import preprocess_rows
+
+    for size in args.sizes:
+        for name, function in (('per row', preprocess_rows_per_row), ('column-wise', preprocess_rows)):
+            elapsed = measure(function, generate_records(size), EXCHANGE_RATE)
+            print(f"{size:>9} rows  {name:<12} {size / elapsed:>12,.0f} rows/s", flush=True)
+
+# ------------------------- #
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""
+Fill Order table with orders of generated sheet `bench` using COPY upsert, daily totals are rebuilt.
+
+    python -m bench.seed 1000000
+"""
+
+from decimal import Decimal
+from typing import Any, Dict, Iterator, List
+
+from bench.utils import generate_records, setup_django
+
+# ------------------------- #
+
+BENCH_SHEET_NAME = 'bench'
+
+EXCHANGE_RATE = Decimal('60.5')
+
+# ------------------------- #
+
+def prepare_rows(records: List[Dict[str, Any]], source_id: int) -> List[Dict[str, Any]]:
+    """
+    Preprocess records and stamp them with fingerprints and source the same way sync does.
+
+    Args:
+        records (List[Dict[str, Any]]): generated sheet records
+        source_id (int): sheet source ID
+
+    Returns:
+        List[Dict[str, Any]]: rows ready for upsert
+    """
+
+    from googlesheets.sync import preprocess_rows, row_fingerprint
+
+    rows = preprocess_rows(records, EXCHANGE_RATE)
+
+    for row in rows:
+        row['row_hash'] = row_fingerprint(row)
+        row['source_id'] = source_id
+
+    return rows
+
+# ------------------------- #
+
+def iter_row_chunks(count: int, chunk_size: int, price_offset: int = 0) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Generate rows of `bench` sheet ready for upsert by chunks.
+
+    Args:
+        count (int): number of rows
+        chunk_size (int): rows per chunk
+        price_offset (int, optional): added to every price to get changed sheet. Defaults to 0.
+
+    Yields:
+        List[Dict[str, Any]]: chunk of rows
+    """
+
+    from googlesheets.models import SheetSource
+
+    source, _ = SheetSource.objects.get_or_create(name=BENCH_SHEET_NAME, defaults=dict(enabled=False))
+    records = generate_records(count, price_offset)
+
+    for start in range(0, count, chunk_size):
+        yield prepare_rows(records[start:start + chunk_size], source.pk)
+
+# ------------------------- #
+
+def seed_orders(count: int) -> None:
+    """
+    Replace orders of `bench` sheet with generated ones.
+
+    Args:
+        count (int): number of orders
+    """
+
+    from django.conf import settings
+    from googlesheets.backends import copy_upsert
+    from googlesheets.cache import bump_data_version
+    from googlesheets.models import SheetSource
+    from googlesheets.sync import refresh_daily_totals
+
+    SheetSource.objects.filter(name=BENCH_SHEET_NAME).delete()
+
+    for rows in iter_row_chunks(count, settings.SHEET_SYNC_CHUNK_SIZE):
+        copy_upsert(rows[0]['source_id'], rows)
+
+    refresh_daily_totals()
+    bump_data_version()
+
+# ------------------------- #
+
+def main() -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('count', type=int, help='number of orders')
+    args = parser.parse_args()
+
+    setup_django()
+    seed_orders(args.count)
+
+    print(f"seeded {args.count} orders of sheet '{BENCH_SHEET_NAME}'")
+
+# ------------------------- #
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Throughput of orders list encoding: DRF `OrderSerializer` with `JSONRenderer` against
+`iter_order_rows` values with `dump_json` using orjson and standard json module.
+Orders of `bench` sheet are seeded for each size, encoded outputs are checked to be equal.
+
+    python -m bench.serializer [--sizes 10000 100000 1000000]
+"""
+
+from time import perf_counter
+
+from bench.utils import get_parser, setup_django
+
+# ------------------------- #
+
+def main() -> None:
+    parser = get_parser(__doc__)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from bench.seed import BENCH_SHEET_NAME, seed_orders
+    from googlesheets import serializers
+    from googlesheets.models import Order, SheetSource
+    from rest_framework.renderers import JSONRenderer
+
+    orjson = serializers.orjson
+
+    def encode_drf(queryset):
+        return JSONRenderer().render(serializers.OrderSerializer(queryset, many=True).data)
+
+    def encode_rows(queryset, json_module):
+        serializers.orjson = json_module
+
+        try:
+            return serializers.dump_json(list(serializers.iter_order_rows(queryset)))
+        finally:
+            serializers.orjson = orjson
+
+    encoders = (
+        ('drf', encode_drf),
+        ('rows+orjson', lambda queryset: encode_rows(queryset, orjson)),
+        ('rows+json', lambda queryset: encode_rows(queryset, None)),
+    )
+
+    if orjson is None:
+        print('orjson is not installed, rows+orjson falls back to json')
+
+    for size in args.sizes:
+        seed_orders(size)
+        queryset = Order.objects.filter(source__name=BENCH_SHEET_NAME)
+        outputs, baseline = list(), None
+
+        for name, encode in encoders:
+            started = perf_counter()
+            outputs.append(encode(queryset))
+            elapsed = perf_counter() - started
+            baseline = baseline or elapsed
+
+            print(
+                f"{size:>9} rows  {name:<12} {elapsed:>8.2f} s {size / elapsed:>12,.0f} rows/s {baseline / elapsed:>6.1f}x",
+                flush=True
+            )
+
+        if any(output != outputs[0] for output in outputs):
+            raise SystemExit('encoded outputs differ')
+
+    SheetSource.objects.filter(name=BENCH_SHEET_NAME).delete()
+
+# ------------------------- #
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""
+Throughput of Order upsert backends: COPY into staging table and single merge against
+ORM bulk upsert. Each size is inserted into empty `bench` sheet and then fully updated,
+orders of the sheet are deleted afterwards.
+
+    python -m bench.upsert [--sizes 10000 100000 1000000] [--backends orm copy]
+"""
+
+from time import perf_counter
+
+from bench.seed import BENCH_SHEET_NAME, iter_row_chunks
+from bench.utils import get_parser, setup_django
+
+# ------------------------- #
+
+def main() -> None:
+    parser = get_parser(__doc__)
+    parser.add_argument('--backends', nargs='+', default=('orm', 'copy'), choices=('orm', 'copy'))
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.conf import settings
+    from django.db import transaction
+    from googlesheets.backends import copy_upsert, orm_upsert
+    from googlesheets.models import SheetSource
+
+    backends = dict(orm=orm_upsert, copy=copy_upsert)
+
+    for size in args.sizes:
+        for name in args.backends:
+            SheetSource.objects.filter(name=BENCH_SHEET_NAME).delete()
+
+            # chunks are generated ahead, so only writes are measured
+
+            for phase, price_offset in (('insert', 0), ('update', 1)):
+                chunks = list(iter_row_chunks(size, settings.SHEET_SYNC_CHUNK_SIZE, price_offset))
+                started = perf_counter()
+
+                for rows in chunks:
+                    with transaction.atomic():
+                        backends[name](rows[0]['source_id'], rows)
+
+                elapsed = perf_counter() - started
+                print(f"{size:>9} rows  {name:<5} {phase:<7} {elapsed:>8.2f} s {size / elapsed:>12,.0f} rows/s", flush=True)
+
+    SheetSource.objects.filter(name=BENCH_SHEET_NAME).delete()
+
+# ------------------------- #
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+import argparse
+import os
+import random
+
+from time import perf_counter
+from typing import Any, Dict, List, Optional
+
+# ------------------------- #
+
+# row counts of sheets measured by default
+DEFAULT_SIZES = (10_000, 100_000, 1_000_000)
+
+# ------------------------- #
+
+def setup_django() -> None:
+    """
+    Configure Django for standalone script using settings of the app by default.
+    """
+
+    import django
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+    django.setup()
+
+# ------------------------- #
+
+def get_parser(description: str) -> argparse.ArgumentParser:
+    """
+    Create argument parser with sheet sizes option shared by benchmarks.
+
+    Args:
+        description (str): benchmark description
+
+    Returns:
+        argparse.ArgumentParser: argument parser
+    """
+
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='numbers of sheet rows')
+
+    return parser
+
+# ------------------------- #
+
+def generate_records(count: int, price_offset: int = 0, seed: Optional[int] = 0) -> List[Dict[str, Any]]:
+    """
+    Generate remapped sheet records with random prices and delivery dates in sheet format.
+
+    Args:
+        count (int): number of records
+        price_offset (int, optional): added to every price to get changed sheet. Defaults to 0.
+        seed (Optional[int], optional): random seed. Defaults to 0.
+
+    Returns:
+        List[Dict[str, Any]]: records of orders numbered from 1
+    """
+
+    rng = random.Random(seed)
+
+    return [
+        dict(
+            index_number=i,
+            order_id=1_000_000 + i,
+            price_USD=rng.randint(1, 2000) + price_offset,
+            delivery_date=f"{rng.randint(1, 28):02d}.{rng.randint(1, 12):02d}.{rng.choice((2021, 2022, 2023))}"
+        )
+        for i in range(1, count + 1)
+    ]
+
+# ------------------------- #
+
+def measure(function: Any, *args: Any) -> float:
+    """
+    Measure wall time of single call.
+
+    Returns:
+        float: seconds
+    """
+
+    started = perf_counter()
+    function(*args)
+
+    return perf_counter() - started
+
+# ------------------------- #
@@ -1,3 +1,10 @@
 from django.contrib import admin
 
-# Register your models here.
+from googlesheets.models import SheetSource
+
+# ------------------------- #
+
+@admin.register(SheetSource)
+class SheetSourceAdmin(admin.ModelAdmin):
+    list_display = ('name', 'key', 'worksheet', 'enabled', 'poll_seconds')
+    list_filter = ('enabled',)
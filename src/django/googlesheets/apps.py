@@ -1,46 +1,113 @@
 import logging
 
 from django.apps import AppConfig
-from django.db.models.signals import post_migrate
+from django.db.models.signals import post_delete, post_migrate, post_save
 
 # ------------------------- #
 
 logger = logging.getLogger(__name__)
 
+# default sheet, orders stored before sheet sources were introduced belong to it
+DEFAULT_SHEET_NAME = 'kanalservis-test'
+
+# periodic sync task name prefix, followed by sheet name
+SHEET_SYNC_TASK_PREFIX = 'googlesheets.tasks.update_table_from_sheet:'
+
 # ------------------------- #
 
-def init_data_and_exchange_rate(sender: AppConfig, **kwargs) -> None:
+def init_sheet_sources(sender: AppConfig, **kwargs) -> None:
     """
-    Initialize data and exchange rate after migration.
+    Register default sheet source and assign orders without source to it.
     """
 
-    from googlesheets.tasks import update_USD_exchange_rate, update_table_from_sheet
+    from googlesheets.models import Order, SheetSource, SheetSyncState
+    from googlesheets.sync import KEY_REPLACE
+
+    source, _ = SheetSource.objects.get_or_create(
+        name=DEFAULT_SHEET_NAME,
+        defaults=dict(column_map=KEY_REPLACE)
+    )
+    legacy = Order.objects.filter(source=None).update(source=source)
+
+    if legacy:
+        logger.info(f"{legacy} orders assigned to sheet '{source.name}'")
 
-    update_USD_exchange_rate.apply_async()
-    update_table_from_sheet.apply_async(countdown=1)
+    # state stored by sheet name before sync state was linked to source is rechecked by full sync
+    SheetSyncState.objects.filter(source=None).delete()
 
 # ------------------------- #
 
-def update_chat_id_telegram_bot() -> None:
+def clear_deleted_sheet_source(**kwargs) -> None:
     """
-    Update chat ID with last value for testing purposes.
+    Recalculate daily totals and invalidate cached responses after sheet source
+    is deleted along with its orders and sync state.
+    """
+
+    from django.db import transaction
+    from googlesheets.cache import bump_data_version
+    from googlesheets.sync import refresh_daily_totals
+
+    refresh_daily_totals()
+    transaction.on_commit(bump_data_version)
+
+# ------------------------- #
+
+def update_sheet_sync_schedules(**kwargs) -> None:
+    """
+    Keep single periodic sync task per sheet source in line with registered sources.
     """
 
-    import os
     import json
-    import requests
-    
-    url = f"https://api.telegram.org/bot{os.environ['TG_BOT_TOKEN']}/getUpdates"
-    response = requests.get(url)
-    data = response.json()
 
-    messages = tuple(filter(lambda x: 'message' in x.keys(), data['result']))
-    subscriptions = tuple(filter(lambda x: x['message']['text'] == '/subscribe', messages))
-    max_datetime = sorted(subscriptions, key=lambda x: x['message']['date'], reverse=True)[0]
+    from django.conf import settings
+    from django_celery_beat.models import IntervalSchedule, PeriodicTask
+    from googlesheets.models import SheetSource
+
+    names = list()
+
+    for source in SheetSource.objects.all():
+        every = source.poll_seconds or settings.SHEET_SYNC_POLL_SECONDS
+        interval, _ = IntervalSchedule.objects.get_or_create(
+            every=every,
+            period=IntervalSchedule.SECONDS,
+        )
+
+        # poll not started before the next one is due is dropped
+        PeriodicTask.objects.update_or_create(
+            name=f'{SHEET_SYNC_TASK_PREFIX}{source.name}',
+            defaults=dict(
+                interval=interval,
+                task='googlesheets.tasks.update_table_from_sheet',
+                args=json.dumps([source.name]),
+                enabled=source.enabled,
+                expire_seconds=every
+            )
+        )
+        names.append(f'{SHEET_SYNC_TASK_PREFIX}{source.name}')
+
+    # tasks of removed or renamed sources
+    PeriodicTask.objects.filter(name__startswith=SHEET_SYNC_TASK_PREFIX).exclude(name__in=names).delete()
+
+# ------------------------- #
+
+def init_data_and_exchange_rate(sender: AppConfig, **kwargs) -> None:
+    """
+    Initialize data and exchange rate after migration.
+    """
 
-    new_chat_id = str(max_datetime['message']['chat']['id'])
+    from googlesheets.tasks import (
+        expire_deliveries,
+        rebuild_daily_totals,
+        sync_all_sheets,
+        update_exchange_rates,
+        update_telegram_subscribers
+    )
 
-    os.environ['TG_BOT_CHAT_ID'] = new_chat_id
+    update_exchange_rates.apply_async(kwargs=dict(force=True))
+    update_telegram_subscribers.apply_async()
+    expire_deliveries.apply_async()
+    rebuild_daily_totals.apply_async()
+    sync_all_sheets.apply_async(countdown=1)
 
 # ------------------------- #
 
@@ -49,6 +116,7 @@ def get_or_create_scheduled_tasks(sender: AppConfig, **kwargs) -> None:
     Configure scheduled tasks using celery.
     """
 
+    from django.conf import settings
     from django_celery_beat.models import PeriodicTask, IntervalSchedule, CrontabSchedule
 
     # construct schedule objects
@@ -56,6 +124,14 @@ def get_or_create_scheduled_tasks(sender: AppConfig, **kwargs) -> None:
             every=15,
             period=IntervalSchedule.SECONDS,
         )
+    interval_subscribers, _ = IntervalSchedule.objects.get_or_create(
+            every=settings.TG_BOT_SUBSCRIBERS_POLL_SECONDS,
+            period=IntervalSchedule.SECONDS,
+        )
+    interval_1m, _ = IntervalSchedule.objects.get_or_create(
+            every=1,
+            period=IntervalSchedule.MINUTES,
+        )
     interval_15m, _ = IntervalSchedule.objects.get_or_create(
             every=15,
             period=IntervalSchedule.MINUTES,
@@ -74,19 +150,40 @@ def get_or_create_scheduled_tasks(sender: AppConfig, **kwargs) -> None:
             hour=9
         )
 
-    # interval tasks
-    PeriodicTask.objects.get_or_create(
-        interval=interval_15s,
-        name='googlesheets.tasks.update_table_from_sheet',
-        task='googlesheets.tasks.update_table_from_sheet'
-    )
-    PeriodicTask.objects.get_or_create(
-        interval=interval_15s,
+    # interval tasks (sheets are synced on change trigger, polling per sheet is fallback),
+    # runs not started before the next one is due are dropped instead of piling up in queue
+    update_sheet_sync_schedules()
+    PeriodicTask.objects.update_or_create(
         name='googlesheets.tasks.notify_about_expired_delivery',
-        task='googlesheets.tasks.notify_about_expired_delivery'
+        defaults=dict(
+            interval=interval_15s,
+            task='googlesheets.tasks.notify_about_expired_delivery',
+            expire_seconds=15
+        )
+    )
+    PeriodicTask.objects.update_or_create(
+        name='googlesheets.tasks.update_telegram_subscribers',
+        defaults=dict(
+            interval=interval_subscribers,
+            task='googlesheets.tasks.update_telegram_subscribers',
+            expire_seconds=settings.TG_BOT_SUBSCRIBERS_POLL_SECONDS
+        )
+    )
+    PeriodicTask.objects.update_or_create(
+        name='googlesheets.tasks.check_queue_depth',
+        defaults=dict(
+            interval=interval_1m,
+            task='googlesheets.tasks.check_queue_depth',
+            expire_seconds=60
+        )
     )
 
     # crontab scheduled tasks
+    PeriodicTask.objects.get_or_create(
+        crontab=crontab_midnight,
+        name='googlesheets.tasks.expire_deliveries',
+        task='googlesheets.tasks.expire_deliveries'
+    )
     PeriodicTask.objects.get_or_create(
         crontab=crontab_midnight,
         name='googlesheets.tasks.reset_notification_status',
@@ -94,10 +191,16 @@ def get_or_create_scheduled_tasks(sender: AppConfig, **kwargs) -> None:
     )
     PeriodicTask.objects.get_or_create(
         crontab=crontab_9am,
-        name='googlesheets.tasks.update_USD_exchange_rate',
-        task='googlesheets.tasks.update_USD_exchange_rate'
+        name='googlesheets.tasks.update_exchange_rates',
+        task='googlesheets.tasks.update_exchange_rates'
     )
 
+    # replaced by multi-currency update and per sheet sync
+    PeriodicTask.objects.filter(name__in=(
+        'googlesheets.tasks.update_USD_exchange_rate',
+        'googlesheets.tasks.update_table_from_sheet'
+    )).delete()
+
 # ------------------------- #
 
 class GooglesheetsConfig(AppConfig):
@@ -108,11 +211,14 @@ class GooglesheetsConfig(AppConfig):
 
     def ready(self) -> None:
 
-        # update chat id
-    
-        update_chat_id_telegram_bot()
-
         # link post migrate state and function calls
 
+        post_migrate.connect(init_sheet_sources, sender=self)
         post_migrate.connect(get_or_create_scheduled_tasks, sender=self)
         post_migrate.connect(init_data_and_exchange_rate, sender=self)
+
+        # reschedule sheet syncs on sheet source change
+
+        post_save.connect(update_sheet_sync_schedules, sender='googlesheets.SheetSource')
+        post_delete.connect(update_sheet_sync_schedules, sender='googlesheets.SheetSource')
+        post_delete.connect(clear_deleted_sheet_source, sender='googlesheets.SheetSource')
@@ -0,0 +1,196 @@
+import csv
+import io
+import logging
+
+from django.conf import settings
+from django.db import connection, transaction
+from datetime import date
+from typing import Any, Callable, Dict, List, Set, Tuple
+
+# ------------------------- #
+
+logger = logging.getLogger(__name__)
+
+# fields written into Order table on every upsert
+UPDATE_FIELDS = (
+    'index_number',
+    'delivery_date',
+    'delivery_expired',
+    'price_USD',
+    'price_RUB',
+    'exchange_rate',
+    'order_id',
+    'source_id',
+    'row_hash'
+)
+
+# fields identifying stored order, not changed by upsert
+MATCH_FIELDS = ('source_id', 'order_id')
+
+# ------------------------- #
+
+def release_index_numbers(source_id: int, rows: List[Dict[str, Any]]) -> None:
+    """
+    Move stored orders away from index numbers taken by other orders in the sheet.
+
+    Such orders get temporary negative index number and empty fingerprint,
+    so they are rewritten when met later in the sheet or deleted on reconciliation.
+
+    Args:
+        source_id (int): sheet source ID
+        rows (List[Dict[str, Any]]): preprocessed rows to be written
+    """
+
+    from django.db.models import F
+    from googlesheets.models import Order
+
+    owners = dict((row['index_number'], row['order_id']) for row in rows)
+    holders = Order.objects.filter(source_id=source_id, index_number__in=owners.keys()).values_list('pk', 'index_number', 'order_id')
+    conflicts = [pk for pk, index_number, order_id in holders if owners[index_number] != order_id]
+
+    if conflicts:
+        Order.objects.filter(pk__in=conflicts).update(index_number=-F('pk'), row_hash='')
+
+# ------------------------- #
+
+def orm_upsert(source_id: int, rows: List[Dict[str, Any]]) -> Tuple[int, int, Set[date]]:
+    """
+    Upsert rows whose fingerprint differs from the stored one using Django ORM.
+
+    Args:
+        source_id (int): sheet source ID
+        rows (List[Dict[str, Any]]): preprocessed rows with fingerprints
+
+    Returns:
+        Tuple[int, int, Set[date]]: number of inserted and updated rows, old and new delivery dates of them
+    """
+
+    from googlesheets.models import Order
+
+    orders = Order.objects.filter(source_id=source_id)
+    stored = dict(
+        (order_id, (row_hash, delivery_date))
+        for order_id, row_hash, delivery_date in orders
+        .filter(order_id__in=[row['order_id'] for row in rows])
+        .values_list('order_id', 'row_hash', 'delivery_date')
+    )
+    changed = [row for row in rows if stored.get(row['order_id'], (None,))[0] != row['row_hash']]
+
+    if not changed:
+        return 0, 0, set()
+
+    dates = set(row['delivery_date'] for row in changed)
+    dates.update(stored[row['order_id']][1] for row in changed if row['order_id'] in stored)
+
+    with transaction.atomic():
+        release_index_numbers(source_id, changed)
+
+        orders.bulk_update_or_create(
+            [Order(**row) for row in changed],
+            update_fields=UPDATE_FIELDS,
+            match_field='order_id'
+        )
+
+    inserted = sum(1 for row in changed if row['order_id'] not in stored)
+
+    return inserted, len(changed) - inserted, dates
+
+# ------------------------- #
+
+def copy_upsert(source_id: int, rows: List[Dict[str, Any]]) -> Tuple[int, int, Set[date]]:
+    """
+    Upsert rows through PostgreSQL COPY into temporary staging table
+    and single INSERT ... ON CONFLICT merge, rows with unchanged fingerprint are not touched.
+
+    Args:
+        source_id (int): sheet source ID
+        rows (List[Dict[str, Any]]): preprocessed rows with fingerprints
+
+    Returns:
+        Tuple[int, int, Set[date]]: number of inserted and updated rows, old and new delivery dates of them
+    """
+
+    from googlesheets.models import Order
+
+    qn = connection.ops.quote_name
+    table = qn(Order._meta.db_table)
+    columns = dict((name, qn(Order._meta.get_field(name).column)) for name in UPDATE_FIELDS)
+    column_list = ', '.join(columns.values())
+    match_list = ', '.join(columns[name] for name in MATCH_FIELDS)
+
+    # serialize rows as CSV
+
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows([row[name] for name in UPDATE_FIELDS] for row in rows)
+    buffer.seek(0)
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"""
+            CREATE TEMPORARY TABLE order_staging ON COMMIT DROP AS
+            SELECT {column_list} FROM {table} WITH NO DATA
+        """)
+        cursor.copy_expert(f"COPY order_staging ({column_list}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+        # collect delivery dates of changed rows before merge
+
+        cursor.execute(f"""
+            SELECT DISTINCT o.{columns['delivery_date']}
+            FROM {table} AS o JOIN order_staging AS s ON o.{columns['order_id']} = s.{columns['order_id']}
+            WHERE o.{columns['source_id']} = %s
+                AND o.{columns['row_hash']} IS DISTINCT FROM s.{columns['row_hash']}
+        """, [source_id])
+
+        dates = set(delivery_date for delivery_date, in cursor.fetchall())
+
+        # release index numbers taken by other orders in the sheet
+
+        cursor.execute(f"""
+            UPDATE {table} AS o
+            SET {columns['index_number']} = -o.{qn(Order._meta.pk.column)}, {columns['row_hash']} = ''
+            FROM order_staging AS s
+            WHERE o.{columns['source_id']} = %s
+                AND o.{columns['index_number']} = s.{columns['index_number']}
+                AND o.{columns['order_id']} <> s.{columns['order_id']}
+        """, [source_id])
+
+        # merge changed rows, new rows are not notified yet
+
+        assignments = ', '.join(
+            f"{column} = EXCLUDED.{column}"
+            for name, column in columns.items()
+            if name not in MATCH_FIELDS
+        )
+
+        cursor.execute(f"""
+            INSERT INTO {table} ({column_list}, {qn(Order._meta.get_field('notification_sent').column)})
+            SELECT {column_list}, FALSE FROM order_staging
+            ON CONFLICT ({match_list}) DO UPDATE SET {assignments}
+            WHERE {table}.{columns['row_hash']} IS DISTINCT FROM EXCLUDED.{columns['row_hash']}
+            RETURNING (xmax = 0), {table}.{columns['delivery_date']}
+        """)
+
+        merged = cursor.fetchall()
+
+        # several chunks may be merged within single outer transaction
+        cursor.execute("DROP TABLE order_staging")
+
+    inserted = sum(1 for flag, _ in merged if flag)
+    dates.update(delivery_date for _, delivery_date in merged)
+
+    return inserted, len(merged) - inserted, dates
+
+# ------------------------- #
+
+def get_upsert_backend() -> Callable[[int, List[Dict[str, Any]]], Tuple[int, int, Set[date]]]:
+    """
+    Get Order upsert function selected by SHEET_SYNC_BACKEND setting.
+
+    Returns:
+        Callable[[int, List[Dict[str, Any]]], Tuple[int, int, Set[date]]]: upsert function
+    """
+
+    backends = dict(orm=orm_upsert, copy=copy_upsert)
+
+    return backends[settings.SHEET_SYNC_BACKEND]
+
+# ------------------------- #
@@ -0,0 +1,298 @@
+import asyncio
+import hashlib
+import logging
+import threading
+import uuid
+
+from asgiref.sync import sync_to_async
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpRequest, HttpResponse, HttpResponseNotModified
+from functools import wraps
+from time import perf_counter
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# ------------------------- #
+
+logger = logging.getLogger(__name__)
+
+DATA_VERSION_KEY = 'googlesheets:data-version'
+RESPONSE_KEY_PREFIX = 'googlesheets:response'
+
+# rendered responses by version and path and the version they belong to (worker process scope)
+_responses: 'OrderedDict[str, Tuple[bytes, str]]' = OrderedDict()
+_responses_version: Optional[str] = None
+_lock = threading.Lock()
+
+# hit counters and accumulated latency (ms) by lookup result (worker process scope)
+_stats: Dict[str, Dict[str, float]] = dict(
+    (result, dict(count=0, latency=0.0))
+    for result in ('not-modified', 'local', 'shared', 'miss', 'bypass')
+)
+
+# ------------------------- #
+
+def get_data_version() -> Optional[str]:
+    """
+    Get current version of Order data shared by all processes, the version is
+    created if missing (e.g. after cache restart or eviction).
+
+    Versions are random tokens rather than counter, so lost version
+    never takes value of the one responses were cached with.
+
+    Returns:
+        Optional[str]: data version, None if cache backend is unavailable
+    """
+
+    try:
+        version = cache.get(DATA_VERSION_KEY)
+
+        if version is None:
+            # concurrent processes agree on the version added first
+            cache.add(DATA_VERSION_KEY, uuid.uuid4().hex, timeout=None)
+            version = cache.get(DATA_VERSION_KEY)
+
+        return version
+
+    except Exception as error:
+        logger.warning(f"cache backend unavailable: {error}")
+        return None
+
+# ------------------------- #
+
+def bump_data_version() -> None:
+    """
+    Invalidate cached responses of all processes after Order data change.
+    """
+
+    version = uuid.uuid4().hex
+
+    try:
+        cache.set(DATA_VERSION_KEY, version, timeout=None)
+        logger.info(f"data version changed to {version}")
+    except Exception as error:
+        logger.error(f"failed to bump data version: {error}")
+
+# ------------------------- #
+
+def get_etag(key: str) -> str:
+    """
+    Get entity tag of cached response.
+
+    Args:
+        key (str): cache key
+
+    Returns:
+        str: quoted ETag value
+    """
+
+    return f'"{hashlib.sha1(key.encode()).hexdigest()}"'
+
+# ------------------------- #
+
+def get_cache_stats() -> Dict[str, Dict[str, float]]:
+    """
+    Get response cache hit rate and mean latency of the worker process.
+
+    Returns:
+        Dict[str, Dict[str, float]]: requests share and mean latency (ms) by lookup result
+    """
+
+    total = sum(item['count'] for item in _stats.values()) or 1
+
+    return dict(
+        (result, dict(
+            rate=item['count'] / total,
+            latency=item['latency'] / item['count'] if item['count'] else 0.0
+        ))
+        for result, item in _stats.items()
+    )
+
+# ------------------------- #
+
+def record(response: HttpResponse, result: str, started: float) -> HttpResponse:
+    """
+    Account lookup result and expose it in response headers.
+
+    Args:
+        response (HttpResponse): response to send
+        result (str): lookup result
+        started (float): request start time
+
+    Returns:
+        HttpResponse: response with X-Cache and Server-Timing headers
+    """
+
+    latency = (perf_counter() - started) * 1000
+
+    _stats[result]['count'] += 1
+    _stats[result]['latency'] += latency
+
+    response['X-Cache'] = result
+    response['Server-Timing'] = f'cache;desc="{result}";dur={latency:.2f}'
+
+    if sum(item['count'] for item in _stats.values()) % settings.SHEETS_CACHE_STATS_INTERVAL == 0:
+        logger.info(f"response cache stats: {get_cache_stats()}")
+
+    return response
+
+# ------------------------- #
+
+def forget_outdated(version: str) -> None:
+    """
+    Drop local responses once the worker process sees new data version.
+
+    Args:
+        version (str): current data version
+    """
+
+    global _responses_version
+
+    if version == _responses_version:
+        return
+
+    with _lock:
+        _responses.clear()
+        _responses_version = version
+
+# ------------------------- #
+
+def remember(key: str, entry: Tuple[bytes, str]) -> None:
+    """
+    Keep recently used response in local LRU.
+
+    Args:
+        key (str): cache key
+        entry (Tuple[bytes, str]): response content and content type
+    """
+
+    with _lock:
+        _responses[key] = entry
+        _responses.move_to_end(key)
+
+        while len(_responses) > settings.SHEETS_CACHE_LOCAL_SIZE:
+            _responses.popitem(last=False)
+
+# ------------------------- #
+
+def lookup_response(request: HttpRequest) -> Tuple[Optional[str], Optional[HttpResponse], str]:
+    """
+    Find cached response for request by data version and full path in local LRU and shared cache,
+    conditional requests with matching ETag get 304 response.
+
+    Args:
+        request (HttpRequest): incoming request
+
+    Returns:
+        Tuple[Optional[str], Optional[HttpResponse], str]: cache key (None if request is not cacheable),
+            cached response (None on miss) and lookup result
+    """
+
+    version = get_data_version() if request.method in ('GET', 'HEAD') else None
+
+    if version is None:
+        return None, None, 'bypass'
+
+    forget_outdated(version)
+    key = f'{version}:{request.get_full_path()}'
+
+    # conditional request
+
+    if get_etag(key) in request.headers.get('If-None-Match', ''):
+        response = HttpResponseNotModified()
+        response['ETag'] = get_etag(key)
+        return key, response, 'not-modified'
+
+    # local and shared lookup
+
+    entry, result = _responses.get(key), 'local'
+
+    if entry is None and settings.SHEETS_CACHE_SHARED:
+        entry, result = cache.get(f'{RESPONSE_KEY_PREFIX}:{key}'), 'shared'
+
+    if entry is None:
+        return key, None, 'miss'
+
+    remember(key, entry)
+
+    response = HttpResponse(entry[0], content_type=entry[1])
+    response['ETag'] = get_etag(key)
+
+    return key, response, result
+
+# ------------------------- #
+
+def store_response(key: Optional[str], response: HttpResponse) -> Tuple[HttpResponse, str]:
+    """
+    Store successful response of view in local LRU and shared cache.
+
+    Args:
+        key (Optional[str]): cache key, None if request is not cacheable
+        response (HttpResponse): response of view
+
+    Returns:
+        Tuple[HttpResponse, str]: response to send and lookup result
+    """
+
+    if key is None or response.status_code != 200 or response.streaming:
+        return response, 'bypass'
+
+    if hasattr(response, 'render'):
+        response.render()
+
+    entry = (response.content, response['Content-Type'])
+
+    if settings.SHEETS_CACHE_SHARED:
+        cache.set(f'{RESPONSE_KEY_PREFIX}:{key}', entry, timeout=settings.SHEETS_CACHE_TIMEOUT)
+
+    remember(key, entry)
+
+    response['ETag'] = get_etag(key)
+
+    return response, 'miss'
+
+# ------------------------- #
+
+def cached_view(view: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Cache GET responses of sync or async view by data version and full path
+    in local LRU and shared cache, conditional requests with matching ETag get 304 response.
+
+    Cache lookups of async view are run in thread pool not to block event loop.
+
+    Args:
+        view (Callable[..., Any]): view to cache
+
+    Returns:
+        Callable[..., Any]: cached view
+    """
+
+    if asyncio.iscoroutinefunction(view):
+
+        @wraps(view)
+        async def async_wrapper(request: HttpRequest, *args, **kwargs) -> HttpResponse:
+            started = perf_counter()
+            key, response, result = await sync_to_async(lookup_response, thread_sensitive=False)(request)
+
+            if response is None:
+                response = await view(request, *args, **kwargs)
+                response, result = await sync_to_async(store_response, thread_sensitive=False)(key, response)
+
+            return record(response, result, started)
+
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request: HttpRequest, *args, **kwargs) -> HttpResponse:
+        started = perf_counter()
+        key, response, result = lookup_response(request)
+
+        if response is None:
+            response, result = store_response(key, view(request, *args, **kwargs))
+
+        return record(response, result, started)
+
+    return wrapper
+
+# ------------------------- #
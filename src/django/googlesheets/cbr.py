@@ -0,0 +1,130 @@
+import io
+import logging
+import requests
+import xml.etree.ElementTree as ElementTree
+
+from datetime import date, datetime
+from decimal import Decimal
+from django.conf import settings
+from django.core.cache import cache
+from requests.adapters import HTTPAdapter
+from typing import IO, Dict, Iterable, Optional, Tuple
+
+# ------------------------- #
+
+logger = logging.getLogger(__name__)
+
+VALIDATORS_KEY = 'googlesheets:cbr-validators'
+
+# pooled HTTP connections to CBR (worker process scope)
+_session = requests.Session()
+_session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=2))
+_session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=2))
+
+# ------------------------- #
+
+def parse_daily_rates(stream: IO[bytes], currencies: Iterable[str]) -> Tuple[date, Dict[str, Decimal]]:
+    """
+    Parse CBR daily rates feed incrementally, parsing stops as soon as all requested currencies are found.
+
+    Args:
+        stream (IO[bytes]): XML_daily.asp response body
+        currencies (Iterable[str]): currency codes in ISO-3 format
+
+    Returns:
+        Tuple[date, Dict[str, Decimal]]: publication date and RUB for one unit of found currencies
+    """
+
+    wanted = set(currencies)
+    rates = dict()
+    rates_date = None
+
+    for event, element in ElementTree.iterparse(stream, events=('start', 'end')):
+        if event == 'start':
+            if element.tag == 'ValCurs':
+                rates_date = datetime.strptime(element.get('Date'), '%d.%m.%Y').date()
+            continue
+
+        if element.tag != 'Valute':
+            continue
+
+        code = element.findtext('CharCode')
+
+        if code in wanted:
+            value = Decimal(element.findtext('Value').replace(',', '.'))
+            rates[code] = value / Decimal(element.findtext('Nominal'))
+
+            if len(rates) == len(wanted):
+                break
+
+        # drop parsed currency subtree
+        element.clear()
+
+    missing = wanted - rates.keys()
+
+    if missing:
+        logger.warning(f"currencies not found in CBR feed: {', '.join(sorted(missing))}")
+
+    return rates_date, rates
+
+# ------------------------- #
+
+def fetch_daily_rates(
+        currencies: Iterable[str],
+        conditional: bool = True
+    ) -> Optional[Tuple[date, Dict[str, Decimal], Dict[str, str]]]:
+    """
+    Fetch CBR daily rates of currencies through pooled session.
+
+    Conditional request is made with validators of the last stored feed shared by all processes.
+    Body is read completely to return connection to the pool, parsing stops early.
+
+    Args:
+        currencies (Iterable[str]): currency codes in ISO-3 format
+        conditional (bool, optional): skip unchanged feed. Defaults to True.
+
+    Returns:
+        Optional[Tuple[date, Dict[str, Decimal], Dict[str, str]]]: publication date, rates
+            and validators of the feed, None if the feed is not modified
+    """
+
+    headers = dict()
+
+    if conditional:
+        try:
+            headers = cache.get(VALIDATORS_KEY) or dict()
+        except Exception as error:
+            logger.warning(f"cache backend unavailable: {error}")
+
+    response = _session.get(settings.CBR_DAILY_URL, headers=headers, timeout=settings.CBR_REQUEST_TIMEOUT)
+
+    if response.status_code == 304:
+        return None
+
+    response.raise_for_status()
+
+    rates_date, rates = parse_daily_rates(io.BytesIO(response.content), currencies)
+    validators = dict(
+        (name, response.headers[header])
+        for name, header in (('If-None-Match', 'ETag'), ('If-Modified-Since', 'Last-Modified'))
+        if header in response.headers
+    )
+
+    return rates_date, rates, validators
+
+# ------------------------- #
+
+def save_validators(validators: Dict[str, str]) -> None:
+    """
+    Keep validators of stored feed for conditional requests of all processes.
+
+    Args:
+        validators (Dict[str, str]): conditional request headers
+    """
+
+    try:
+        cache.set(VALIDATORS_KEY, validators, timeout=None)
+    except Exception as error:
+        logger.warning(f"cache backend unavailable: {error}")
+
+# ------------------------- #
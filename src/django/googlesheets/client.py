@@ -0,0 +1,140 @@
+import gspread
+import logging
+import os
+
+from datetime import datetime, timedelta
+from django.conf import settings
+from google.auth.exceptions import RefreshError
+from oauth2client.service_account import ServiceAccountCredentials
+from pathlib import Path
+from time import perf_counter
+from typing import Any, Dict
+
+# ------------------------- #
+
+BASE_DIR = Path(__file__).resolve().parent.parent # src
+logger = logging.getLogger(__name__)
+
+# authorize scope
+SCOPE = (
+    "https://spreadsheets.google.com/feeds",
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive.file",
+    "https://www.googleapis.com/auth/drive"
+)
+
+# authorized clients and opened worksheets per sheet name (worker process scope)
+_worksheets: Dict[str, Dict[str, Any]] = dict()
+
+# ------------------------- #
+
+def authorize_client() -> gspread.Client:
+    """
+    Load credentials for Google API and authorize client.
+
+    Returns:
+        gspread.Client: authorized client
+    """
+
+    credspath = os.path.join(BASE_DIR, "secret/creds.json")
+    creds = ServiceAccountCredentials.from_json_keyfile_name(credspath, SCOPE)
+
+    return gspread.authorize(creds)
+
+# ------------------------- #
+
+def get_worksheet(sheet_name: str, key: str = '', worksheet: str = '') -> gspread.Worksheet:
+    """
+    Get worksheet of specified sheet reusing authorized client of the worker process.
+
+    Cached worksheet is re-fetched by spreadsheet key and worksheet ID to keep
+    grid properties actual, access token is refreshed only when it is close to expiry.
+    Worksheet is re-opened if the sheet was re-pointed to another spreadsheet key or worksheet.
+
+    Args:
+        sheet_name (str): Google Sheet name
+        key (str, optional): spreadsheet key to open instead of searching by name. Defaults to ''.
+        worksheet (str, optional): worksheet title, the first worksheet if empty. Defaults to ''.
+
+    Returns:
+        gspread.Worksheet: worksheet of the sheet
+    """
+
+    started = perf_counter()
+    location = (key, worksheet)
+    entry = _worksheets.get(sheet_name)
+
+    if entry is not None and entry['location'] != location:
+        invalidate_worksheet(sheet_name)
+        entry = None
+
+    if entry is None:
+        client = authorize_client()
+        spreadsheet = client.open_by_key(key) if key else client.open(sheet_name)
+        worksheet = spreadsheet.worksheet(worksheet) if worksheet else spreadsheet.sheet1
+
+        _worksheets[sheet_name] = dict(
+            client=client,
+            key=spreadsheet.id,
+            location=location,
+            spreadsheet=spreadsheet,
+            worksheet=worksheet,
+            open_time=perf_counter() - started
+        )
+
+        logger.info(f"worksheet cache miss for '{sheet_name}', opened in {_worksheets[sheet_name]['open_time'] * 1000:.0f} ms")
+
+        return worksheet
+
+    # refresh token ahead of expiry
+
+    auth = entry['client'].auth
+    margin = timedelta(seconds=settings.SHEET_CLIENT_TOKEN_REFRESH_MARGIN)
+
+    if auth.expiry is None or auth.expiry - margin <= datetime.utcnow():
+        entry['client'].login()
+
+    entry['worksheet'] = entry['spreadsheet'].get_worksheet_by_id(entry['worksheet'].id)
+
+    logger.info(
+        f"worksheet cache hit for '{sheet_name}' (key {entry['key']}), "
+        f"saved {(entry['open_time'] - (perf_counter() - started)) * 1000:.0f} ms"
+    )
+
+    return entry['worksheet']
+
+# ------------------------- #
+
+def is_auth_error(error: Exception) -> bool:
+    """
+    Check if error is caused by expired or revoked authorization.
+
+    Args:
+        error (Exception): error raised by Google API call
+
+    Returns:
+        bool: True for token refresh errors and 401/403 API responses
+    """
+
+    if isinstance(error, RefreshError):
+        return True
+
+    if isinstance(error, gspread.exceptions.APIError):
+        return error.response.status_code in (401, 403)
+
+    return False
+
+# ------------------------- #
+
+def invalidate_worksheet(sheet_name: str) -> None:
+    """
+    Drop cached client and worksheet of specified sheet.
+
+    Args:
+        sheet_name (str): Google Sheet name
+    """
+
+    if _worksheets.pop(sheet_name, None) is not None:
+        logger.info(f"worksheet cache invalidated for '{sheet_name}'")
+
+# ------------------------- #
@@ -0,0 +1,205 @@
+import io
+import logging
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import QuerySet
+from queue import Full, Queue
+from tempfile import SpooledTemporaryFile
+from threading import Event, Thread
+from typing import IO, Callable, Iterator, Union
+
+from googlesheets.reader import iter_chunks
+from googlesheets.serializers import OrderSerializer
+
+# ------------------------- #
+
+logger = logging.getLogger(__name__)
+
+# exported columns
+EXPORT_FIELDS = OrderSerializer.Meta.fields
+
+# size of streamed export chunks and max number of chunks waiting to be sent
+EXPORT_CHUNK_SIZE = 64 * 1024
+EXPORT_QUEUE_SIZE = 16
+
+# ------------------------- #
+
+def spooled_file() -> IO[bytes]:
+    """
+    Create temporary file kept in memory up to SHEETS_EXPORT_SPOOL_SIZE bytes.
+
+    Returns:
+        IO[bytes]: temporary binary file
+    """
+
+    return SpooledTemporaryFile(max_size=settings.SHEETS_EXPORT_SPOOL_SIZE)
+
+# ------------------------- #
+
+def export_csv(queryset: QuerySet, file: IO[bytes]) -> None:
+    """
+    Write Order queryset as CSV with header using PostgreSQL COPY TO STDOUT.
+
+    Args:
+        queryset (QuerySet): Order queryset
+        file (IO[bytes]): binary file to write
+    """
+
+    sql, params = queryset.values_list(*EXPORT_FIELDS).query.sql_with_params()
+
+    # header of serializer field names, COPY would name foreign keys by their columns
+
+    file.write(f"{','.join(EXPORT_FIELDS)}\n".encode())
+
+    with connection.cursor() as cursor:
+        query = cursor.mogrify(sql, params).decode()
+        cursor.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT csv)", file)
+
+# ------------------------- #
+
+def export_arrow(queryset: QuerySet, file: IO[bytes], parquet: bool = False) -> None:
+    """
+    Write Order queryset as Apache Arrow IPC stream or Parquet file by record batches.
+
+    Args:
+        queryset (QuerySet): Order queryset
+        file (IO[bytes]): binary file to write
+        parquet (bool, optional): write Parquet instead of Arrow IPC. Defaults to False.
+    """
+
+    import pyarrow as pa
+
+    schema = pa.schema([
+        ('index_number', pa.int32()),
+        ('order_id', pa.string()),
+        ('price_USD', pa.decimal128(20, 2)),
+        ('price_RUB', pa.decimal128(20, 2)),
+        ('delivery_date', pa.date32()),
+        ('source', pa.int64()),
+    ])
+
+    if parquet:
+        import pyarrow.parquet as pq
+        writer = pq.ParquetWriter(file, schema)
+    else:
+        writer = pa.ipc.new_stream(file, schema)
+
+    rows = queryset.values_list(*EXPORT_FIELDS).iterator(chunk_size=settings.SHEETS_STREAM_CHUNK_SIZE)
+
+    with writer:
+        for chunk in iter_chunks(rows, settings.SHEETS_STREAM_CHUNK_SIZE):
+            columns = list(zip(*chunk))
+            batch = pa.record_batch(
+                [pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+                schema=schema
+            )
+            writer.write_table(pa.Table.from_batches([batch]))
+
+# ------------------------- #
+
+class QueueWriter(io.RawIOBase):
+    """
+    Binary file passing written data to reading thread through bounded queue.
+    """
+
+    def __init__(self, maxsize: int) -> None:
+        """
+        Args:
+            maxsize (int): max number of chunks waiting to be read
+        """
+
+        self.queue = Queue(maxsize)
+        self.cancelled = Event()
+        self.written = 0
+
+    # ......................... #
+
+    def writable(self) -> bool:
+        return True
+
+    # ......................... #
+
+    def tell(self) -> int:
+        return self.written
+
+    # ......................... #
+
+    def write(self, data: bytes) -> int:
+        self.put(bytes(data))
+        self.written += len(data)
+
+        return len(data)
+
+    # ......................... #
+
+    def put(self, item: Union[bytes, Exception, None]) -> None:
+        """
+        Put item into the queue waiting while reader is behind.
+
+        Raises:
+            OSError: reader stopped reading
+        """
+
+        while not self.cancelled.is_set():
+            try:
+                self.queue.put(item, timeout=1)
+                return
+            except Full:
+                pass
+
+        raise OSError("export reader is gone")
+
+# ------------------------- #
+
+def iter_export(export: Callable[[QuerySet, IO[bytes]], None], queryset: QuerySet) -> Iterator[bytes]:
+    """
+    Run export in thread and yield written chunks as they come, so the first bytes
+    are sent before the export is finished and memory usage does not depend on export size.
+
+    Export thread uses its own database connection closed when the export is done
+    or the iterator is closed by disconnected client.
+
+    Args:
+        export (Callable[[QuerySet, IO[bytes]], None]): function writing queryset into binary file
+        queryset (QuerySet): Order queryset
+
+    Yields:
+        bytes: exported data chunk
+    """
+
+    raw = QueueWriter(EXPORT_QUEUE_SIZE)
+
+    def run() -> None:
+        try:
+            file = io.BufferedWriter(raw, buffer_size=EXPORT_CHUNK_SIZE)
+            export(queryset, file)
+            file.flush()
+            raw.put(None)
+
+        except Exception as error:
+            if not raw.cancelled.is_set():
+                logger.error(f"export failed: {error}")
+                raw.put(error)
+
+        finally:
+            connection.close()
+
+    Thread(target=run, daemon=True).start()
+
+    try:
+        while True:
+            item = raw.queue.get()
+
+            if item is None:
+                return
+
+            if isinstance(item, Exception):
+                raise item
+
+            yield item
+
+    finally:
+        raw.cancelled.set()
+
+# ------------------------- #
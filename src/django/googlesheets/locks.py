@@ -0,0 +1,97 @@
+import logging
+
+from contextlib import contextmanager
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from typing import Iterator
+from uuid import uuid4
+
+# ------------------------- #
+
+logger = logging.getLogger(__name__)
+
+LOCK_KEY_PREFIX = 'googlesheets:lock'
+
+# delete lock key only if it still holds the owner token
+RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+# ------------------------- #
+
+@contextmanager
+def single_flight(name: str, timeout: int) -> Iterator[bool]:
+    """
+    Hold named lock shared by all processes while the block runs, so the block
+    is run by single process at a time and others skip it.
+
+    Lock is taken by atomic add with expiry (SET NX EX on Redis) and released only by its owner,
+    lock of crashed worker is released after timeout. The block is run without lock if cache backend is unavailable.
+
+    Args:
+        name (str): lock name
+        timeout (int): seconds the lock is held at most
+
+    Yields:
+        bool: True if the lock is acquired and the block should run
+    """
+
+    key = f'{LOCK_KEY_PREFIX}:{name}'
+    token = uuid4().hex
+
+    try:
+        acquired = cache.add(key, token, timeout=timeout)
+        locked = acquired
+    except Exception as error:
+        logger.warning(f"cache backend unavailable, '{name}' runs without lock: {error}")
+        acquired, locked = True, False
+
+    try:
+        yield acquired
+
+    finally:
+        if locked:
+            release_lock(key, token)
+
+# ------------------------- #
+
+def release_lock(key: str, token: str) -> None:
+    """
+    Release lock if it is still held by the owner, expired lock may be already taken by other process.
+
+    Args:
+        key (str): lock cache key
+        token (str): owner token
+    """
+
+    from django.core.cache.backends.redis import RedisCache
+
+    backend = caches[DEFAULT_CACHE_ALIAS]
+
+    try:
+        if isinstance(backend, RedisCache):
+            # compare and delete atomically by script on Redis side
+
+            client = backend._cache.get_client(key, write=True)
+            release = client.register_script(RELEASE_SCRIPT)
+            released = release(
+                keys=[backend.make_and_validate_key(key)],
+                args=[backend._cache._serializer.dumps(token)]
+            )
+        else:
+            # local backends (tests, development) are not shared between hosts
+
+            released = cache.get(key) == token
+
+            if released:
+                cache.delete(key)
+
+        if not released:
+            logger.warning(f"lock '{key}' expired before release, raise its timeout")
+
+    except Exception as error:
+        logger.warning(f"cache backend unavailable, lock '{key}' is released on expiry: {error}")
+
+# ------------------------- #
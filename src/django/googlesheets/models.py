@@ -1,7 +1,111 @@
 from unicodedata import decimal
 from bulk_update_or_create import BulkUpdateOrCreateQuerySet
 from django.contrib.postgres import fields as psqlfields
-from django.db import models
+from datetime import date
+from django.db import connections, models
+from typing import List, Tuple
+
+# ------------------------- #
+
+class OrderQuerySet(BulkUpdateOrCreateQuerySet):
+    """
+    Order queryset with set-based notification state updates.
+    """
+
+    def claim_expired_for_notification(self) -> List[Tuple[int, str, str, date]]:
+        """
+        Mark expired orders without notification as notified using single UPDATE ... RETURNING.
+
+        Rows locked by concurrent claim are skipped, so every order is claimed once.
+        The claim should be committed before sending, orders failed to be notified are reset by the caller.
+
+        Returns:
+            List[Tuple[int, str, str, date]]: primary key, sheet name, order ID and delivery date of claimed orders
+        """
+
+        connection = connections[self.db]
+        qn = connection.ops.quote_name
+        opts = self.model._meta
+
+        table = qn(opts.db_table)
+        pk = qn(opts.pk.column)
+        source_table = qn(SheetSource._meta.db_table)
+        source_pk, source_name = qn(SheetSource._meta.pk.column), qn(SheetSource._meta.get_field('name').column)
+        source, order_id, delivery_date, delivery_expired, notification_sent = (
+            qn(opts.get_field(name).column)
+            for name in ('source', 'order_id', 'delivery_date', 'delivery_expired', 'notification_sent')
+        )
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                WITH claimed AS (
+                    SELECT {pk} FROM {table}
+                    WHERE {delivery_expired} AND NOT {notification_sent}
+                    FOR UPDATE SKIP LOCKED
+                )
+                UPDATE {table} AS o SET {notification_sent} = TRUE
+                FROM claimed
+                WHERE o.{pk} = claimed.{pk}
+                RETURNING
+                    o.{pk},
+                    (SELECT s.{source_name} FROM {source_table} AS s WHERE s.{source_pk} = o.{source}),
+                    o.{order_id},
+                    o.{delivery_date}
+            """)
+
+            return cursor.fetchall()
+
+    # ......................... #
+
+    def reset_notifications(self) -> int:
+        """
+        Reset notification status for expired orders using single UPDATE.
+
+        Returns:
+            int: number of reset orders
+        """
+
+        return self.filter(delivery_expired=True, notification_sent=True).update(notification_sent=False)
+
+    # ......................... #
+
+    def expire_deliveries(self, today: date) -> int:
+        """
+        Mark orders with delivery date reached as expired using single UPDATE,
+        so expiration does not depend on the sheet rows being rewritten.
+
+        Args:
+            today (date): current date
+
+        Returns:
+            int: number of newly expired orders
+        """
+
+        return self.filter(delivery_expired=False, delivery_date__lte=today).update(delivery_expired=True)
+
+# ------------------------- #
+
+class SheetSource(models.Model):
+    """
+    External Google Sheet synced into Order table.
+    """
+
+    name = models.CharField(max_length=255, unique=True)
+    key = models.CharField(max_length=100, blank=True, default='')
+    worksheet = models.CharField(max_length=255, blank=True, default='')
+    column_map = models.JSONField(default=dict)
+    enabled = models.BooleanField(default=True)
+    poll_seconds = models.PositiveIntegerField(null=True, blank=True)
+
+    # ......................... #
+
+    class Meta:
+        ordering = ('name',)
+
+    # ......................... #
+
+    def __str__(self) -> str:
+        return self.name
 
 # ------------------------- #
 
@@ -10,19 +114,101 @@ class Order(models.Model):
     Main order model to store data from external Google Sheet.
     """
 
-    objects = BulkUpdateOrCreateQuerySet.as_manager()
+    objects = OrderQuerySet.as_manager()
 
-    order_id = models.CharField(max_length=100, unique=True)
-    index_number = models.IntegerField(unique=True)
+    source = models.ForeignKey(SheetSource, on_delete=models.CASCADE, null=True, related_name='orders')
+    order_id = models.CharField(max_length=100)
+    index_number = models.IntegerField()
     delivery_date = models.DateField()
     price_USD = models.DecimalField(max_digits=20, decimal_places=2)
     price_RUB = models.DecimalField(max_digits=20, decimal_places=2)
+    exchange_rate = models.DecimalField(max_digits=12, decimal_places=4, null=True)
     delivery_expired = models.BooleanField()
     notification_sent = models.BooleanField(default=False)
+    row_hash = models.CharField(max_length=40, default='')
     
     # ......................... #
 
     class Meta:
-        ordering = ('index_number',)
+        ordering = ('source_id', 'index_number')
+        constraints = (
+            # orders are identified within the sheet they come from
+            models.UniqueConstraint(fields=('source', 'order_id'), name='order_source_order_id_uniq'),
+            models.UniqueConstraint(fields=('source', 'index_number'), name='order_source_index_number_uniq'),
+        )
+        indexes = (
+            # range scans over delivery dates and daily totals aggregation
+            models.Index(
+                fields=('delivery_date',),
+                include=('price_USD', 'price_RUB'),
+                name='order_delivery_date_price_idx'
+            ),
+            # expired orders waiting for notification, claimed every 15 seconds
+            models.Index(
+                fields=('id',),
+                condition=models.Q(delivery_expired=True, notification_sent=False),
+                name='order_pending_notification_idx'
+            ),
+        )
+
+# ------------------------- #
 
-# ------------------------- #
\ No newline at end of file
+class SheetSyncState(models.Model):
+    """
+    Content hashes of external Google Sheet chunks at the last successful sync.
+    """
+
+    source = models.OneToOneField(SheetSource, on_delete=models.CASCADE, null=True, related_name='sync_state')
+    chunk_hashes = models.JSONField(default=list)
+    synced_at = models.DateTimeField(auto_now=True)
+
+# ------------------------- #
+
+class DailyTotal(models.Model):
+    """
+    Order prices aggregated by delivery date, maintained by sheet sync.
+    """
+
+    delivery_date = models.DateField(unique=True)
+    price_USD = models.DecimalField(max_digits=20, decimal_places=2)
+    price_RUB = models.DecimalField(max_digits=20, decimal_places=2)
+    orders = models.IntegerField()
+
+    # ......................... #
+
+    class Meta:
+        ordering = ('delivery_date',)
+
+# ------------------------- #
+
+class ExchangeRate(models.Model):
+    """
+    Exchange rates of currencies to RUB by publication date.
+    """
+
+    date = models.DateField()
+    currency = models.CharField(max_length=3)
+    rate = models.DecimalField(max_digits=20, decimal_places=8)
+
+    # ......................... #
+
+    class Meta:
+        unique_together = ('date', 'currency')
+        ordering = ('-date',)
+
+# ------------------------- #
+
+class TelegramSubscriber(models.Model):
+    """
+    Chats subscribed to expired orders notifications via Telegram Bot.
+    """
+
+    chat_id = models.CharField(max_length=32, unique=True)
+    subscribed_at = models.DateTimeField()
+
+    # ......................... #
+
+    class Meta:
+        ordering = ('-subscribed_at',)
+
+# ------------------------- #
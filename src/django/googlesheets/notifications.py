@@ -0,0 +1,221 @@
+import html
+import logging
+import os
+import time
+
+from django.conf import settings
+from typing import Any, Iterator, List, Tuple
+
+# ------------------------- #
+
+logger = logging.getLogger(__name__)
+
+# Telegram message text limit
+MESSAGE_LIMIT = 4096
+
+MESSAGE_TITLE = '<b>Несоблюдение срока поставки</b>'
+
+# ------------------------- #
+
+class TokenBucket:
+    """
+    Token bucket rate limiter blocking until token is available.
+    """
+
+    def __init__(self, rate: float, capacity: int) -> None:
+        """
+        Args:
+            rate (float): tokens added per second
+            capacity (int): max number of tokens (burst size)
+        """
+
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    # ......................... #
+
+    def acquire(self) -> None:
+        """
+        Take single token, sleep while the bucket is empty.
+        """
+
+        while True:
+            current = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (current - self.updated) * self.rate)
+            self.updated = current
+
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+
+            time.sleep((1 - self.tokens) / self.rate)
+
+# ------------------------- #
+
+# shared by all notifications of the worker process
+_bucket = TokenBucket(settings.TG_BOT_MESSAGES_PER_SECOND, settings.TG_BOT_MESSAGES_BURST)
+
+# ------------------------- #
+
+def render_message(rows: List[Tuple[int, str, str, int]]) -> str:
+    """
+    Render expired orders table as HTML message.
+
+    Args:
+        rows (List[Tuple[int, str, str, int]]): order primary key, sheet name, order ID and days overdue
+
+    Returns:
+        str: message text
+    """
+
+    import prettytable as pt
+
+    table = pt.PrettyTable(['Таблица', 'Заказ №', 'Дней назад'])
+    table.align['Таблица'] = 'l'
+    table.align['Заказ №'] = 'l'
+
+    for _, *row in rows:
+        table.add_row(row)
+
+    return f'{MESSAGE_TITLE}\n\n<pre>{html.escape(str(table))}</pre>'
+
+# ------------------------- #
+
+def paginate_rows(
+        rows: List[Tuple[int, str, str, int]],
+        limit: int = MESSAGE_LIMIT
+    ) -> Iterator[List[Tuple[int, str, str, int]]]:
+    """
+    Split table rows into pages rendered as messages not longer than limit.
+
+    Args:
+        rows (List[Tuple[int, str, str, int]]): order primary key, sheet name, order ID and days overdue
+        limit (int, optional): max message length. Defaults to MESSAGE_LIMIT.
+
+    Yields:
+        List[Tuple[int, str, str, int]]: rows of single message
+    """
+
+    def fits(end: int) -> bool:
+        return len(render_message(rows[start:end])) <= limit
+
+    # every row adds a line not narrower than the header border of the empty table,
+    # so the search is bounded by the number of such lines fitting into the limit
+
+    empty = render_message([])
+    min_line_width = len(empty.splitlines()[-2]) + 1
+    max_page_size = max(1, (limit - len(empty)) // min_line_width)
+
+    start, page_size = 0, max_page_size
+
+    while start < len(rows):
+        low, high = start + 1, min(len(rows), start + max_page_size)
+
+        # rows are alike, so probe the previous page size first
+
+        guess = min(high, start + page_size)
+
+        if fits(guess):
+            low = guess
+
+            if low < high:
+                if fits(low + 1):
+                    low += 1
+                else:
+                    high = low
+        else:
+            high = guess - 1
+
+        # binary search of the largest page fitting into the limit
+
+        while low < high:
+            middle = (low + high + 1) // 2
+
+            if fits(middle):
+                low = middle
+            else:
+                high = middle - 1
+
+        yield rows[start:low]
+        start, page_size = low, low - start
+
+# ------------------------- #
+
+def send_message(bot: Any, chat_id: str, text: str) -> bool:
+    """
+    Send HTML message through rate limiter retrying on flood control and network errors.
+
+    Args:
+        bot (Any): Telegram Bot instance
+        chat_id (str): target chat ID
+        text (str): message text
+
+    Returns:
+        bool: True if the message was sent
+    """
+
+    import telegram
+    from telegram.error import BadRequest, NetworkError, RetryAfter, Unauthorized
+
+    for attempt in range(settings.TG_BOT_SEND_RETRIES + 1):
+        _bucket.acquire()
+
+        try:
+            bot.send_message(chat_id=chat_id, text=text, parse_mode=telegram.ParseMode.HTML)
+            return True
+
+        except RetryAfter as error:
+            logger.warning(f"flood control exceeded, retry in {error.retry_after} s")
+            time.sleep(error.retry_after)
+
+        except (BadRequest, Unauthorized) as error:
+            logger.error(f"message rejected: {error}")
+            return False
+
+        except NetworkError as error:
+            delay = settings.TG_BOT_SEND_BACKOFF * 2 ** attempt
+            logger.warning(f"sending failed: {error}, retry in {delay} s")
+            time.sleep(delay)
+
+    return False
+
+# ------------------------- #
+
+def send_expired_delivery_messages(rows: List[Tuple[int, str, str, int]]) -> List[int]:
+    """
+    Send expired orders table paginated into size-bounded messages via Telegram Bot.
+
+    Args:
+        rows (List[Tuple[int, str, str, int]]): order primary key, sheet name, order ID and days overdue
+
+    Returns:
+        List[int]: primary keys of orders whose message was sent
+    """
+
+    import telegram
+    from googlesheets.subscribers import get_chat_id
+
+    chat_id = get_chat_id()
+
+    if chat_id is None:
+        logger.warning(f"nobody subscribed to notifications, {len(rows)} expired orders are not notified")
+        return list()
+
+    bot = telegram.Bot(token=os.environ['TG_BOT_TOKEN'], base_url=settings.TG_BOT_API_URL)
+
+    # sort items by days overdue descending
+
+    rows = sorted(rows, key=lambda x: x[-1], reverse=True)
+    sent = list()
+
+    for page in paginate_rows(rows):
+        if send_message(bot, chat_id, render_message(page)):
+            sent.extend(pk for pk, *_ in page)
+
+    logger.info(f"expired orders notified: {len(sent)} of {len(rows)}")
+
+    return sent
+
+# ------------------------- #
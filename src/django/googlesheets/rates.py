@@ -0,0 +1,125 @@
+import logging
+import time
+
+from datetime import date
+from decimal import Decimal
+from django.conf import settings
+from django.core.cache import cache
+from typing import Dict, Tuple
+
+# ------------------------- #
+
+logger = logging.getLogger(__name__)
+
+RATE_KEY_PREFIX = 'googlesheets:exchange-rate'
+
+# latest rates and their expiry time by currency (worker process scope)
+_rates: Dict[str, Tuple[Decimal, float]] = dict()
+
+# ------------------------- #
+
+def get_exchange_rate(currency: str = 'USD', cached: bool = True) -> Decimal:
+    """
+    Get the latest stored exchange rate of currency to RUB
+    looking through process cache, shared cache and ExchangeRate table.
+
+    Args:
+        currency (str, optional): currency code in ISO-3 format. Defaults to 'USD'.
+        cached (bool, optional): use process and shared cache. Defaults to True.
+
+    Raises:
+        LookupError: no rate stored for the currency
+
+    Returns:
+        Decimal: RUB for one unit of currency
+    """
+
+    from googlesheets.models import ExchangeRate
+
+    key = f'{RATE_KEY_PREFIX}:{currency}'
+
+    if cached:
+        rate, expiry = _rates.get(currency, (None, 0.0))
+
+        if rate is not None and expiry > time.monotonic():
+            return rate
+
+        try:
+            rate = cache.get(key)
+        except Exception as error:
+            logger.warning(f"cache backend unavailable: {error}")
+            rate = None
+
+        if rate is not None:
+            _rates[currency] = (rate, time.monotonic() + settings.EXCHANGE_RATE_LOCAL_TIMEOUT)
+            return rate
+
+    latest = ExchangeRate.objects.filter(currency=currency).order_by('-date').first()
+
+    if latest is None:
+        raise LookupError(f"no exchange rate stored for {currency}")
+
+    _rates[currency] = (latest.rate, time.monotonic() + settings.EXCHANGE_RATE_LOCAL_TIMEOUT)
+
+    try:
+        cache.set(key, latest.rate, timeout=None)
+    except Exception as error:
+        logger.warning(f"cache backend unavailable: {error}")
+
+    return latest.rate
+
+# ------------------------- #
+
+def store_exchange_rate(currency: str, rate: Decimal, rate_date: date) -> bool:
+    """
+    Store exchange rate of currency to RUB published for date and refresh cached latest rate.
+
+    Args:
+        currency (str): currency code in ISO-3 format
+        rate (Decimal): RUB for one unit of currency
+        rate_date (date): publication date
+
+    Returns:
+        bool: True if the latest rate of currency has changed
+    """
+
+    from django.db import transaction
+    from googlesheets.models import ExchangeRate
+
+    rates = ExchangeRate.objects.filter(currency=currency).order_by('-date').values_list('rate', flat=True)
+    previous = rates.first()
+
+    ExchangeRate.objects.update_or_create(date=rate_date, currency=currency, defaults=dict(rate=rate))
+
+    # cached rate is replaced once the new one is visible to other processes
+
+    def refresh_cached_rate() -> None:
+        _rates.pop(currency, None)
+        get_exchange_rate(currency, cached=False)
+
+    transaction.on_commit(refresh_cached_rate)
+
+    return rates.first() != previous
+
+# ------------------------- #
+
+def apply_exchange_rate(rate: Decimal) -> int:
+    """
+    Recalculate RUB prices of orders stamped with other USD rate using single UPDATE.
+
+    Args:
+        rate (Decimal): RUB for one USD
+
+    Returns:
+        int: number of updated orders
+    """
+
+    from django.db.models import F, Q
+    from django.db.models.functions import Round
+    from googlesheets.models import Order
+
+    stale = Order.objects.filter(~Q(exchange_rate=rate) | Q(exchange_rate__isnull=True))
+
+    return stale.update(price_RUB=Round(F('price_USD') * rate, 2), exchange_rate=rate)
+
+# ------------------------- #
@@ -0,0 +1,71 @@
+import logging
+
+from typing import Any, Dict, Iterable, Iterator, List
+
+# ------------------------- #
+
+logger = logging.getLogger(__name__)
+
+# ------------------------- #
+
+def iter_sheet_records(worksheet: Any, page_size: int, head: int = 1) -> Iterator[Dict[str, Any]]:
+    """
+    Read worksheet records page by page using row ranges (e.g. A2:D5001, A5002:D10001, ...).
+
+    Values are numericised the same way as gspread `get_all_records` does. Only
+    `row_values`, `get_values` and `row_count` of the worksheet are used,
+    so any object implementing them can be read.
+
+    Args:
+        worksheet (Any): gspread worksheet or compatible object
+        page_size (int): number of rows fetched by single range request
+        head (int, optional): header row number. Defaults to 1.
+
+    Yields:
+        Dict[str, Any]: worksheet record mapped by header
+    """
+
+    from gspread.utils import numericise_all, rowcol_to_a1
+
+    header = worksheet.row_values(head)
+
+    if not header:
+        return
+
+    for start in range(head + 1, worksheet.row_count + 1, page_size):
+        end = min(start + page_size - 1, worksheet.row_count)
+        page = worksheet.get_values(f"{rowcol_to_a1(start, 1)}:{rowcol_to_a1(end, len(header))}")
+
+        logger.debug(f"fetched rows {start}-{end}: {len(page)} values")
+
+        for row in page:
+            row = numericise_all(row + [''] * (len(header) - len(row)))
+            yield dict(zip(header, row))
+
+# ------------------------- #
+
+def iter_chunks(iterable: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """
+    Split iterable into lists of fixed size, the last one may be shorter.
+
+    Args:
+        iterable (Iterable[Any]): items to split
+        size (int): chunk size
+
+    Yields:
+        List[Any]: chunk of items
+    """
+
+    chunk = list()
+
+    for item in iterable:
+        chunk.append(item)
+
+        if len(chunk) == size:
+            yield chunk
+            chunk = list()
+
+    if chunk:
+        yield chunk
+
+# ------------------------- #
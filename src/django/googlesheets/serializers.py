@@ -1,7 +1,19 @@
+import json
+
+from django.db import models
+from django.db.models import Expression, F, Func, QuerySet
+from django.db.models.functions import Cast
 from rest_framework.serializers import ModelSerializer
+from rest_framework.settings import api_settings
+from typing import Any, Dict, Iterator, Optional
 
 from googlesheets.models import Order
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # ------------------------- #
 
 class OrderSerializer(ModelSerializer):
@@ -13,5 +25,77 @@ class OrderSerializer(ModelSerializer):
             'order_id',
             'price_USD',
             'price_RUB',
-            'delivery_date'
-        )
\ No newline at end of file
+            'delivery_date',
+            'source'
+        )
+
+# ------------------------- #
+
+def get_field_expression(field: models.Field) -> Expression:
+    """
+    Get expression selecting model field value formatted by database
+    the same way as ModelSerializer formats it.
+
+    Args:
+        field (models.Field): model field
+
+    Returns:
+        Expression: field value expression
+    """
+
+    if isinstance(field, models.DecimalField) and api_settings.COERCE_DECIMAL_TO_STRING:
+        return Cast(field.name, output_field=models.CharField())
+
+    # rendered as float by DRF JSON encoder
+    if isinstance(field, models.DecimalField):
+        return Cast(field.name, output_field=models.FloatField())
+
+    if isinstance(field, models.DateField):
+        return Func(F(field.name), template="to_char(%(expressions)s, 'YYYY-MM-DD')", output_field=models.CharField())
+
+    return F(field.name)
+
+# ------------------------- #
+
+def iter_order_rows(queryset: QuerySet, chunk_size: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Serialize Order objects bypassing ModelSerializer, formatted fields are fetched as tuples.
+
+    Output is equal to OrderSerializer output for Order table values (decimals with 2 places).
+
+    Args:
+        queryset (QuerySet): Order queryset
+        chunk_size (Optional[int], optional): fetch rows using server-side cursor by chunks of this size. Defaults to None.
+
+    Yields:
+        Dict[str, Any]: serialized object
+    """
+
+    fields = OrderSerializer.Meta.fields
+    values_list = queryset.values_list(*(get_field_expression(Order._meta.get_field(name)) for name in fields))
+
+    if chunk_size is not None:
+        values_list = values_list.iterator(chunk_size=chunk_size)
+
+    for values in values_list:
+        yield dict(zip(fields, values))
+
+# ------------------------- #
+
+def dump_json(data: Any) -> bytes:
+    """
+    Encode data as compact UTF-8 JSON using orjson if available.
+
+    Args:
+        data (Any): JSON serializable data of builtin types
+
+    Returns:
+        bytes: encoded data
+    """
+
+    if orjson is not None:
+        return orjson.dumps(data)
+
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+# ------------------------- #
@@ -0,0 +1,110 @@
+import logging
+import os
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from typing import Optional, Tuple
+
+# ------------------------- #
+
+logger = logging.getLogger(__name__)
+
+SUBSCRIBER_KEY = 'googlesheets:tg-subscriber'
+UPDATES_OFFSET_KEY = 'googlesheets:tg-updates-offset'
+
+SUBSCRIBE_COMMAND = '/subscribe'
+
+# chat ID of the latest subscriber and its expiry time (worker process scope)
+_subscriber: Tuple[Optional[str], float] = (None, 0.0)
+
+# ------------------------- #
+
+def get_chat_id() -> Optional[str]:
+    """
+    Get chat ID of the latest subscriber looking through process cache, shared cache
+    and TelegramSubscriber table, TG_BOT_CHAT_ID environment variable is used if nobody subscribed yet.
+
+    Returns:
+        Optional[str]: chat ID, None if there is no subscriber
+    """
+
+    global _subscriber
+
+    from googlesheets.models import TelegramSubscriber
+
+    chat_id, expiry = _subscriber
+
+    if chat_id is not None and expiry > time.monotonic():
+        return chat_id
+
+    try:
+        chat_id = cache.get(SUBSCRIBER_KEY)
+    except Exception as error:
+        logger.warning(f"cache backend unavailable: {error}")
+        chat_id = None
+
+    if chat_id is None:
+        chat_id = TelegramSubscriber.objects.values_list('chat_id', flat=True).first()
+
+        if chat_id is None:
+            return os.environ.get('TG_BOT_CHAT_ID')
+
+        try:
+            cache.set(SUBSCRIBER_KEY, chat_id, timeout=None)
+        except Exception as error:
+            logger.warning(f"cache backend unavailable: {error}")
+
+    _subscriber = (chat_id, time.monotonic() + settings.TG_BOT_SUBSCRIBER_LOCAL_TIMEOUT)
+
+    return chat_id
+
+# ------------------------- #
+
+def refresh_subscribers() -> int:
+    """
+    Store chats sent subscribe command to Telegram Bot since the last refresh in TelegramSubscriber table.
+
+    Pending bot updates are fetched without long polling and confirmed
+    on the next refresh, so failed refresh gets the same updates again.
+
+    Returns:
+        int: number of received subscriptions
+    """
+
+    global _subscriber
+
+    import telegram
+    from googlesheets.models import TelegramSubscriber
+
+    bot = telegram.Bot(token=os.environ['TG_BOT_TOKEN'], base_url=settings.TG_BOT_API_URL)
+    updates = bot.get_updates(
+        offset=cache.get(UPDATES_OFFSET_KEY),
+        timeout=0,
+        allowed_updates=['message']
+    )
+
+    subscriptions = [
+        update.message
+        for update in updates
+        if update.message is not None and (update.message.text or '').strip() == SUBSCRIBE_COMMAND
+    ]
+
+    for message in subscriptions:
+        TelegramSubscriber.objects.update_or_create(
+            chat_id=str(message.chat.id),
+            defaults=dict(subscribed_at=message.date)
+        )
+
+    if updates:
+        cache.set(UPDATES_OFFSET_KEY, updates[-1].update_id + 1, timeout=None)
+
+    # the latest subscriber may have changed
+
+    if subscriptions:
+        cache.delete(SUBSCRIBER_KEY)
+        _subscriber = (None, 0.0)
+
+    return len(subscriptions)
+
+# ------------------------- #
@@ -0,0 +1,338 @@
+import hashlib
+import logging
+
+from datetime import date, datetime
+from decimal import Decimal, ROUND_HALF_UP
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils.timezone import now
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from googlesheets.backends import get_upsert_backend
+from googlesheets.cache import bump_data_version
+from googlesheets.rates import apply_exchange_rate, get_exchange_rate
+from googlesheets.reader import iter_chunks
+
+# ------------------------- #
+
+logger = logging.getLogger(__name__)
+
+# default column names remapping
+KEY_REPLACE = {
+    "№": "index_number",
+    "заказ №": "order_id",
+    "стоимость, $": "price_USD",
+    "срок поставки" : "delivery_date"
+}
+
+# fields covered by row fingerprint (delivery expiration is derived from date by daily sweep)
+FINGERPRINT_FIELDS = (
+    'order_id',
+    'index_number',
+    'delivery_date',
+    'price_USD'
+)
+
+# price precision used by Order table
+CENT = Decimal('0.01')
+
+# advisory lock serializing daily totals refresh of concurrent syncs
+DAILY_TOTALS_LOCK_ID = 0x6461696c79
+
+# ------------------------- #
+
+def normalize_records(
+        records: Iterable[Dict[str, Any]],
+        column_map: Optional[Dict[str, str]] = None
+    ) -> Iterator[Dict[str, Any]]:
+    """
+    Remap sheet column names and filter out bad rows by simple condition, unmapped columns are dropped.
+
+    Args:
+        records (Iterable[Dict[str, Any]]): raw sheet records
+        column_map (Optional[Dict[str, str]], optional): sheet column to Order field mapping. Defaults to KEY_REPLACE.
+
+    Yields:
+        Dict[str, Any]: remapped row without empty cells
+    """
+
+    column_map = column_map or KEY_REPLACE
+    rows = (
+        dict((column_map[key], value) for key, value in row.items() if key in column_map)
+        for row in records
+    )
+
+    return (row for row in rows if not ('' in row.values()))
+
+# ------------------------- #
+
+def parse_delivery_date(value: str) -> date:
+    """
+    Parse delivery date using sheet date format with fallback to generic parser.
+
+    Args:
+        value (str): delivery date cell value
+
+    Returns:
+        date: parsed delivery date
+    """
+
+    try:
+        return datetime.strptime(value, settings.SHEET_DATE_FORMAT).date()
+    except ValueError:
+        from dateutil import parser as dtparser
+        return dtparser.parse(value, dayfirst=True).date()
+
+# ------------------------- #
+
+def preprocess_rows(rows: List[Dict[str, Any]], exchange_rate: Decimal) -> List[Dict[str, Any]]:
+    """
+    Parse dates, check delivery expiration and calculate price in RUB column-wise.
+
+    Every distinct date string is parsed once, current date is captured once per batch.
+
+    Args:
+        rows (List[Dict[str, Any]]): remapped rows
+        exchange_rate (Decimal): RUB for one USD
+
+    Returns:
+        List[Dict[str, Any]]: preprocessed rows stamped with exchange rate
+    """
+
+    today = now().date()
+
+    # build columns
+
+    order_ids = [str(row['order_id']) for row in rows]
+    dates = [row['delivery_date'] for row in rows]
+    prices_usd = [Decimal(str(row['price_USD'])).quantize(CENT) for row in rows]
+
+    # parse unique dates only
+
+    parsed = dict((value, parse_delivery_date(value)) for value in set(dates))
+    dates = [parsed[value] for value in dates]
+
+    # derived columns
+
+    expired = [value <= today for value in dates]
+    prices_rub = [(value * exchange_rate).quantize(CENT, ROUND_HALF_UP) for value in prices_usd]
+
+    return [
+        dict(
+            index_number=row['index_number'],
+            order_id=order_id,
+            delivery_date=delivery_date,
+            delivery_expired=delivery_expired,
+            price_USD=price_usd,
+            price_RUB=price_rub,
+            exchange_rate=exchange_rate
+        )
+        for row, order_id, delivery_date, delivery_expired, price_usd, price_rub
+        in zip(rows, order_ids, dates, expired, prices_usd, prices_rub)
+    ]
+
+# ------------------------- #
+
+def row_fingerprint(row: Dict[str, Any]) -> str:
+    """
+    Calculate content fingerprint of preprocessed row.
+
+    Args:
+        row (Dict[str, Any]): preprocessed row
+
+    Returns:
+        str: hex digest of row content
+    """
+
+    values = (str(row[key]) for key in FINGERPRINT_FIELDS)
+
+    return hashlib.sha1('\x1f'.join(values).encode()).hexdigest()
+
+# ------------------------- #
+
+def delete_stale_orders(source_id: int, sheet_ids: Set[str], stored_ids: Set[str]) -> Tuple[int, Set[date]]:
+    """
+    Delete orders removed from the sheet using single set-based statement.
+
+    Deletion is refused when the sheet looks truncated: the fetch returned no rows
+    or stale rows exceed SHEET_SYNC_MAX_DELETE_RATIO of stored ones.
+
+    Args:
+        source_id (int): sheet source ID
+        sheet_ids (Set[str]): order IDs present in the sheet
+        stored_ids (Set[str]): order IDs of the sheet stored in Order table
+
+    Returns:
+        Tuple[int, Set[date]]: number of deleted rows (-1 if deletion was refused), delivery dates of them
+    """
+
+    from googlesheets.models import Order
+
+    stale = stored_ids - sheet_ids
+
+    if not stale:
+        return 0, set()
+
+    if not sheet_ids or len(stale) > settings.SHEET_SYNC_MAX_DELETE_RATIO * len(stored_ids):
+        logger.warning(
+            f"refused to delete {len(stale)} of {len(stored_ids)} stored orders "
+            f"while sheet has {len(sheet_ids)} rows, check the sheet or raise SHEET_SYNC_MAX_DELETE_RATIO"
+        )
+        return -1, set()
+
+    stale = Order.objects.filter(source_id=source_id, order_id__in=stale)
+    dates = set(stale.values_list('delivery_date', flat=True).distinct())
+    deleted, _ = stale.delete()
+
+    return deleted, dates
+
+# ------------------------- #
+
+def refresh_daily_totals(dates: Optional[Set[date]] = None) -> None:
+    """
+    Recalculate daily totals of specified delivery dates, empty dates are removed.
+
+    Concurrent refreshes (syncs of different sheets) are serialized by transaction-level advisory lock.
+
+    Args:
+        dates (Optional[Set[date]], optional): delivery dates to recalculate, all dates if None. Defaults to None.
+    """
+
+    from django.db.models import Count, Sum
+    from googlesheets.models import DailyTotal, Order
+
+    orders = Order.objects.all()
+    totals = DailyTotal.objects.all()
+
+    if dates is not None:
+        if not dates:
+            return
+
+        orders = orders.filter(delivery_date__in=dates)
+        totals = totals.filter(delivery_date__in=dates)
+
+    aggregated = (orders
+        .order_by()
+        .values('delivery_date')
+        .annotate(
+            total_USD=Sum('price_USD'),
+            total_RUB=Sum('price_RUB'),
+            count=Count('*')
+        )
+    )
+
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_xact_lock(%s)", [DAILY_TOTALS_LOCK_ID])
+
+        totals.delete()
+        DailyTotal.objects.bulk_create(
+            DailyTotal(
+                delivery_date=row['delivery_date'],
+                price_USD=row['total_USD'],
+                price_RUB=row['total_RUB'],
+                orders=row['count']
+            )
+            for row in aggregated
+        )
+
+# ------------------------- #
+
+def sync_orders(source: Any, records: Iterable[Dict[str, Any]]) -> Dict[str, int]:
+    """
+    Write only inserted, changed and deleted rows of the sheet into Order table, orders of other sheets are not touched.
+
+    Records are consumed as a stream and flushed in chunks of SHEET_SYNC_CHUNK_SIZE rows.
+    Chunk with content hash unchanged since the last run is skipped without database access,
+    other chunks are compared with stored rows by fingerprint. RUB prices use the latest
+    USD rate looked up once per run, rate changes are applied by `apply_exchange_rate`.
+
+    Args:
+        source (SheetSource): sheet source to sync, keeps its sync state
+        records (Iterable[Dict[str, Any]]): raw sheet records
+
+    Returns:
+        Dict[str, int]: number of inserted, updated and deleted rows (-1 if deletion was refused)
+    """
+
+    from googlesheets.models import Order, SheetSyncState
+
+    sheet_name = source.name
+    stats = dict(inserted=0, updated=0, deleted=0)
+
+    # load chunk hashes of the last run
+
+    state = SheetSyncState.objects.filter(source=source).first()
+    previous = state.chunk_hashes if state is not None else list()
+    exchange_rate = get_exchange_rate('USD')
+    upsert = get_upsert_backend()
+    chunk_hashes = list()
+    sheet_ids = set()
+
+    for index, chunk in enumerate(iter_chunks(normalize_records(records, source.column_map), settings.SHEET_SYNC_CHUNK_SIZE)):
+        rows = preprocess_rows(chunk, exchange_rate)
+
+        for row in rows:
+            row['row_hash'] = row_fingerprint(row)
+            row['source_id'] = source.pk
+            sheet_ids.add(row['order_id'])
+
+        chunk_hashes.append(hashlib.sha1(''.join(row['row_hash'] for row in rows).encode()).hexdigest())
+
+        if index < len(previous) and previous[index] == chunk_hashes[-1]:
+            continue
+
+        # invalidate sync state before the first write, so failed run is fully rechecked
+
+        if previous:
+            SheetSyncState.objects.filter(source=source).update(chunk_hashes=list())
+            previous = list()
+
+        # keep daily totals consistent with written chunk
+
+        with transaction.atomic():
+            inserted, updated, dates = upsert(source.pk, rows)
+            refresh_daily_totals(dates)
+
+        stats['inserted'] += inserted
+        stats['updated'] += updated
+
+    # skip sync if sheet content is unchanged
+
+    if chunk_hashes == previous:
+        logger.info(f"sheet '{sheet_name}' is unchanged, sync skipped")
+        return stats
+
+    with transaction.atomic():
+        stored_ids = set(Order.objects.filter(source=source).values_list('order_id', flat=True))
+        stats['deleted'], dates = delete_stale_orders(source.pk, sheet_ids, stored_ids)
+        refresh_daily_totals(dates)
+
+    # keep refused sync state dirty to recheck deletions on the next run
+
+    if stats['deleted'] < 0:
+        chunk_hashes = list()
+
+    SheetSyncState.objects.update_or_create(
+        source=source,
+        defaults=dict(chunk_hashes=chunk_hashes)
+    )
+
+    # rate changed during the run may have been applied before rows of this run were written
+
+    if stats['inserted'] or stats['updated']:
+        latest_rate = get_exchange_rate('USD', cached=False)
+
+        if latest_rate != exchange_rate:
+            with transaction.atomic():
+                apply_exchange_rate(latest_rate)
+                refresh_daily_totals()
+
+    if stats['inserted'] or stats['updated'] or stats['deleted'] > 0:
+        bump_data_version()
+
+    logger.info(f"sheet '{sheet_name}' synced: {stats}")
+
+    return stats
+
+# ------------------------- #
@@ -1,177 +1,302 @@
-import gspread
 import logging
-import os
-import requests
-import xmltodict
 
 from django.utils.timezone import now
-from dateutil import parser as dtparser
-from oauth2client.service_account import ServiceAccountCredentials
-from pathlib import Path
 
 from backend.celery.celery import app as celery_app
 
 # ------------------------- #
 
-BASE_DIR = Path(__file__).resolve().parent.parent # src
 logger = logging.getLogger(__name__)
 
 # ------------------------- #
 
 @celery_app.task
-def update_table_from_sheet(sheet_name: str = "kanalservis-test"):
+def update_table_from_sheet(sheet_name: str = "kanalservis-test") -> str:
     """
-    Bulk update of table Order from external Google Sheet via Google API.
+    Incremental update of table Order from registered Google Sheet via Google API.
+
+    At most one sync of the sheet is in flight: run overlapping with running sync is skipped
+    and the running sync enqueues single follow-up run on finish to catch changes made meanwhile.
 
     Args:
-        sheet_name (str, optional): Google Sheet name to use. Defaults to "kanalservis-test".
+        sheet_name (str, optional): name of SheetSource to sync. Defaults to "kanalservis-test".
+
+    Returns:
+        str: info message
     """
 
-    from googlesheets.models import Order
+    from django.conf import settings
+    from backend.celery.celery import get_queue_depth
+    from googlesheets.client import get_worksheet, invalidate_worksheet, is_auth_error
+    from googlesheets.locks import single_flight
+    from googlesheets.models import SheetSource
+    from googlesheets.rates import get_exchange_rate
+    from googlesheets.reader import iter_sheet_records
+    from googlesheets.sync import sync_orders
+    from googlesheets.triggers import clear_sync_request, pop_followup_sync, request_followup_sync, request_sync
+
+    source = SheetSource.objects.filter(name=sheet_name, enabled=True).first()
+
+    if source is None:
+        clear_sync_request(sheet_name)
+        return f"sheet '{sheet_name}' is not registered or disabled, sync skipped"
+
+    with single_flight(f'sync:{sheet_name}', settings.SHEET_SYNC_LOCK_TIMEOUT) as acquired:
+        if not acquired:
+            # pending flag is left set, so triggers keep being coalesced instead of enqueueing runs
+            request_followup_sync(sheet_name)
+            logger.warning(f"sync of '{sheet_name}' is already running, {get_queue_depth()} tasks queued")
+            return f"sync of '{sheet_name}' is already running, skipped"
+
+        # changes notified from now on need another run
+        clear_sync_request(sheet_name)
+
+        # fetch exchange rate if none is stored yet (first run)
+
+        try:
+            get_exchange_rate('USD')
+        except LookupError:
+            update_exchange_rates(force=True)
+
+        try:
+            # reuse authorized client and stream sheet data by pages
+            sheet = get_worksheet(source.name, source.key, source.worksheet)
+            records = iter_sheet_records(sheet, settings.SHEET_SYNC_PAGE_SIZE)
+
+            # write only changed rows
+            stats = sync_orders(source, records)
+        except Exception as error:
+            if is_auth_error(error):
+                invalidate_worksheet(sheet_name)
+            raise
+        finally:
+            # runs skipped meanwhile are replaced by single one, it starts after the lock is released
+            if pop_followup_sync(sheet_name):
+                clear_sync_request(sheet_name)
+                request_sync(sheet_name)
+
+    return f"sheet '{sheet_name}' synced: {stats}"
+
+# ------------------------- #
+
+@celery_app.task
+def sync_all_sheets() -> str:
+    """
+    Sync all enabled sheets in parallel, each sheet is synced by separate task,
+    so concurrency is bounded by worker pool size and total time is that of the slowest sheet.
+
+    Returns:
+        str: info message
+    """
+
+    from celery import group
+    from googlesheets.models import SheetSource
+    from googlesheets.rates import get_exchange_rate
+
+    # fetch exchange rate once before syncs if none is stored yet (first run)
+
+    try:
+        get_exchange_rate('USD')
+    except LookupError:
+        update_exchange_rates(force=True)
 
-    # column names remapping
-    key_replace = {
-        "№": "index_number",
-        "заказ №": "order_id",
-        "стоимость, $": "price_USD",
-        "срок поставки" : "delivery_date"
-    }
-
-    # authorize scope
-    scope = (
-        "https://spreadsheets.google.com/feeds",
-        "https://www.googleapis.com/auth/spreadsheets",
-        "https://www.googleapis.com/auth/drive.file",
-        "https://www.googleapis.com/auth/drive"
-    )
-
-    # load credentials for Google API
-    credspath = os.path.join(BASE_DIR, "secret/creds.json")
-    creds = ServiceAccountCredentials.from_json_keyfile_name(credspath, scope)
-
-    # autorize client
-    client = gspread.authorize(creds)
-
-    # open specified sheet and get all data
-    sheet = client.open(sheet_name).sheet1
-    data = sheet.get_all_records()
-
-    # filter out bad rows by simple condition
-    data = [
-        dict((key_replace[key], value) for key, value in row.items()) 
-        for row in data 
-        if not ('' in row.values())
-    ]
-
-    # preprocess data
-    for row in data:
-        # parse delivery date
-        row['delivery_date'] = dtparser.parse(row['delivery_date'])
-        # check is delivery expired
-        row['delivery_expired'] = (row['delivery_date'] - now().replace(tzinfo=None)).days < 0
-        row['delivery_date'] = row['delivery_date'].strftime(format="%Y-%m-%d")
-        # calculate price in RUB using polled exchange rate
-        row['price_RUB'] = float(os.environ['USD_EXCHANGE_RATE']) * row['price_USD']
-
-    # build data for bulk update
-    data = [Order(**row) for row in data]
-
-    Order.objects.bulk_update_or_create(
-        data, 
-        update_fields=('index_number', 'delivery_expired', 'price_USD', 'price_RUB', 'order_id'),
-        match_field='order_id'
-    )
+    names = list(SheetSource.objects.filter(enabled=True).values_list('name', flat=True))
+
+    group(update_table_from_sheet.s(name) for name in names).apply_async()
+
+    return f"sync enqueued for {len(names)} sheets: {', '.join(names)}"
 
 # ------------------------- #
 
 @celery_app.task
-def notify_about_expired_delivery():
+def notify_about_expired_delivery() -> str:
     """
-    Send notification about expired delivery orders via Telegram Bot.
+    Send notification about expired delivery orders via Telegram Bot, run overlapping with running one is skipped.
+
+    Returns:
+        str: info message
     """
-    
-    import telegram
-    import prettytable as pt
+
+    from django.conf import settings
+    from django.db import transaction
+    from googlesheets.locks import single_flight
     from googlesheets.models import Order
+    from googlesheets.notifications import send_expired_delivery_messages
+
+    with single_flight('notify', settings.TG_BOT_NOTIFY_LOCK_TIMEOUT) as acquired:
+        if not acquired:
+            return "notification is already running, skipped"
+
+        # claim recently expired objects without notification, row locks are released on commit
 
-    # find recently expired objects without notification
+        with transaction.atomic():
+            claimed = Order.objects.claim_expired_for_notification()
 
-    expired_no_notified = Order.objects.filter(
-        delivery_expired=True,
-        notification_sent=False
-    )
+        today = now().date()
 
-    message_content = dict()
+        message_content = [
+            (pk, sheet_name, order_id, (today - delivery_date).days)
+            for pk, sheet_name, order_id, delivery_date in claimed
+        ]
 
-    # build message content and update objects state
+        # send messages outside transaction, Telegram retries and rate limit waits
+        # do not block sync writing the same orders, flag is kept only for sent ones
 
-    for row in expired_no_notified:
-        row.notification_sent = True
-        message_content[row.order_id] = -(row.delivery_date - now().date()).days
-        row.save()
+        if message_content:
+            sent = set()
 
-    # send message if content non empty
-    
-    if message_content:
+            try:
+                sent.update(send_expired_delivery_messages(message_content))
+            finally:
+                unsent = [pk for pk, *_ in message_content if pk not in sent]
 
-        # build table
+                if unsent:
+                    Order.objects.filter(pk__in=unsent).update(notification_sent=False)
 
-        table = pt.PrettyTable(['Заказ №', 'Дней назад'])
-        table.align['Order ID'] = 'l'
-        table.align['Days overdue'] = 'l'
+    return f"expired orders claimed: {len(message_content)}"
 
-        # sort items by days overdue descending and put into the table
+# ------------------------- #
+
+@celery_app.task
+def update_telegram_subscribers() -> str:
+    """
+    Store chats subscribed to notifications via Telegram Bot since the last run.
+
+    Returns:
+        str: info message
+    """
 
-        message_content = sorted(message_content.items(), key=lambda x: x[1], reverse=True)
+    from googlesheets.subscribers import refresh_subscribers
 
-        for row in message_content:
-            table.add_row(row)
+    subscribed = refresh_subscribers()
 
-        # send message into specified chat
-        
-        bot = telegram.Bot(token=os.environ['TG_BOT_TOKEN'])
-        bot.sendMessage(
-            chat_id=os.environ['TG_BOT_CHAT_ID'], 
-            text=f'<b>Несоблюдение срока поставки</b>\n\n<pre>{table}</pre>', 
-            parse_mode=telegram.ParseMode.HTML
-        )
+    return f"new subscriptions: {subscribed}"
 
 # ------------------------- #
 
 @celery_app.task
-def reset_notification_status():
+def expire_deliveries() -> str:
+    """
+    Mark orders whose delivery date has come as expired.
+
+    Returns:
+        str: info message
+    """
+
+    from googlesheets.models import Order
+
+    expired = Order.objects.expire_deliveries(now().date())
+
+    return f"delivery expired for {expired} orders"
+
+# ------------------------- #
+
+@celery_app.task
+def reset_notification_status() -> str:
     """
     Reset notification status for expired objects.
+
+    Returns:
+        str: info message
     """
 
     from googlesheets.models import Order
 
-    expired = Order.objects.filter(
-        delivery_expired=True
-    )
+    reset = Order.objects.reset_notifications()
+
+    return f"notification status reset for {reset} orders"
+
+# ------------------------- #
+
+@celery_app.task
+def rebuild_daily_totals() -> str:
+    """
+    Recalculate daily totals of all delivery dates from table Order.
+
+    Returns:
+        str: info message
+    """
+
+    from googlesheets.cache import bump_data_version
+    from googlesheets.models import DailyTotal
+    from googlesheets.sync import refresh_daily_totals
+
+    refresh_daily_totals()
+    bump_data_version()
+
+    return f"daily totals rebuilt for {DailyTotal.objects.count()} dates"
+
+# ------------------------- #
+
+@celery_app.task
+def update_exchange_rates(force: bool = False) -> str:
+    """
+    Update exchange rates of EXCHANGE_RATE_CURRENCIES using CBR script and store them in ExchangeRate table,
+    RUB prices of orders are recalculated if USD rate has changed.
+
+    Args:
+        force (bool, optional): fetch the feed even if it is not modified. Defaults to False.
+
+    Returns:
+        str: info message
+    """
+
+    from django.conf import settings
+    from django.db import transaction
+    from googlesheets.cache import bump_data_version
+    from googlesheets.cbr import fetch_daily_rates, save_validators
+    from googlesheets.rates import apply_exchange_rate, store_exchange_rate
+    from googlesheets.sync import refresh_daily_totals
+
+    currencies = set(settings.EXCHANGE_RATE_CURRENCIES) | {'USD'}
+    fetched = fetch_daily_rates(currencies, conditional=not force)
 
-    for row in expired:
-        row.notification_sent = False
-        row.save()
+    if fetched is None:
+        return "exchange rates feed is not modified"
+
+    rates_date, rates, validators = fetched
+
+    with transaction.atomic():
+        changed = [
+            currency
+            for currency, rate in rates.items()
+            if store_exchange_rate(currency, rate, rates_date)
+        ]
+
+        if 'USD' in changed:
+            updated = apply_exchange_rate(rates['USD'])
+            refresh_daily_totals()
+
+    save_validators(validators)
+
+    rates_info = ', '.join(f"{rate:.4f} RUB in 1 {currency}" for currency, rate in sorted(rates.items()))
+
+    if 'USD' not in changed:
+        return f"exchange rates on {rates_date}: {rates_info}"
+
+    bump_data_version()
+
+    return f"exchange rates on {rates_date}: {rates_info}, RUB prices recalculated for {updated} orders"
 
 # ------------------------- #
 
 @celery_app.task
-def update_USD_exchange_rate() -> str:
+def check_queue_depth() -> str:
     """
-    Update USDRUB exchange rate and store as enviroment variable using CBR script.
+    Report number of tasks waiting in default queue, warn if it exceeds CELERY_QUEUE_DEPTH_WARNING.
 
     Returns:
         str: info message
     """
 
-    response = requests.get('http://www.cbr.ru/scripts/XML_daily.asp')
-    tree = xmltodict.parse(response.content)
-    usd = filter(lambda x: x['@ID'] == 'R01235', tree['ValCurs']['Valute'])
-    exchange_rate = tuple(usd)[0]['Value'].replace(',', '.')
+    from django.conf import settings
+    from backend.celery.celery import get_queue_depth
 
-    os.environ['USD_EXCHANGE_RATE'] = exchange_rate
+    depth = get_queue_depth()
 
-    return f"current exchange rate: {os.environ['USD_EXCHANGE_RATE']} RUB in 1 USD"
+    if depth is not None and depth > settings.CELERY_QUEUE_DEPTH_WARNING:
+        logger.warning(f"{depth} tasks queued, workers are falling behind")
 
-# ------------------------- #
\ No newline at end of file
+    return f"tasks queued: {depth}"
+
+# ------------------------- #
@@ -1,3 +1,1755 @@
-from django.test import TestCase
+import io
+import json
+import os
+import subprocess
+import sys
 
-# Create your tests here.
+from datetime import date
+from decimal import Decimal
+from django.core.cache import cache
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from typing import Any, Dict, List
+from unittest import mock
+
+from googlesheets import locks, notifications, rates, subscribers
+from googlesheets.models import DailyTotal, ExchangeRate, Order, SheetSource, TelegramSubscriber
+from googlesheets.reader import iter_sheet_records
+from googlesheets.sync import sync_orders
+
+# ------------------------- #
+
+# tests do not depend on shared cache service
+LOCMEM_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+HEADER = ['№', 'заказ №', 'стоимость, $', 'срок поставки']
+
+# ------------------------- #
+
+class FakeWorksheet:
+    """
+    In-memory worksheet implementing the subset of gspread Worksheet used by the sheet reader.
+    """
+
+    def __init__(self, rows: List[List[Any]]) -> None:
+        """
+        Args:
+            rows (List[List[Any]]): sheet rows including header, cells are strings as returned by Sheets API
+        """
+
+        self.rows = rows
+        self.requests = list()
+
+    # ......................... #
+
+    @property
+    def row_count(self) -> int:
+        return len(self.rows)
+
+    # ......................... #
+
+    def row_values(self, row: int) -> List[Any]:
+        return list(self.rows[row - 1])
+
+    # ......................... #
+
+    def get_values(self, range_name: str) -> List[List[Any]]:
+        from gspread.utils import a1_to_rowcol
+
+        self.requests.append(range_name)
+
+        start, end = range_name.split(':')
+        (first, _), (last, columns) = a1_to_rowcol(start), a1_to_rowcol(end)
+
+        # trailing empty cells are omitted by Sheets API
+        page = [list(row[:columns]) for row in self.rows[first - 1:last]]
+
+        for row in page:
+            while row and row[-1] == '':
+                row.pop()
+
+        return page
+
+# ------------------------- #
+
+def make_sheet(orders: List[List[Any]]) -> FakeWorksheet:
+    """
+    Build worksheet of orders given as index number, order ID, USD price and delivery date.
+    """
+
+    return FakeWorksheet([HEADER] + [[str(value) for value in row] for row in orders])
+
+# ------------------------- #
+
+class SheetReaderTest(TestCase):
+
+    def test_records_are_read_by_row_ranges(self) -> None:
+        sheet = make_sheet([[i, 1000 + i, 10, '01.06.2022'] for i in range(1, 8)])
+        records = list(iter_sheet_records(sheet, page_size=3))
+
+        self.assertEqual(sheet.requests, ['A2:D4', 'A5:D7', 'A8:D8'])
+        self.assertEqual([record['№'] for record in records], list(range(1, 8)))
+        self.assertEqual(records[0], {'№': 1, 'заказ №': 1001, 'стоимость, $': 10, 'срок поставки': '01.06.2022'})
+
+    # ......................... #
+
+    def test_short_rows_are_padded(self) -> None:
+        sheet = make_sheet([[1, 1001, 10, '']])
+
+        self.assertEqual(list(iter_sheet_records(sheet, page_size=10))[0]['срок поставки'], '')
+
+    # ......................... #
+
+    def test_empty_sheet(self) -> None:
+        self.assertEqual(list(iter_sheet_records(FakeWorksheet([[]]), page_size=10)), [])
+
+# ------------------------- #
+
+class SheetSyncTestMixin:
+    """
+    Sheet sync scenarios run against every upsert backend, synced by chunks of 2 rows.
+    """
+
+    def setUp(self) -> None:
+        cache.clear()
+        rates._rates.clear()
+
+        ExchangeRate.objects.create(date=date.today(), currency='USD', rate=Decimal('60'))
+
+        self.source = SheetSource.objects.create(name='test-sheet')
+        self.other = SheetSource.objects.create(name='other-sheet')
+
+        self.orders = [
+            [1, 1001, 10, '01.06.2022'],
+            [2, 1002, 20, '01.06.2022'],
+            [3, 1003, 30, '02.06.2022'],
+            [4, 1004, 40, '03.06.2022'],
+        ]
+
+        self.sync(self.other, [[1, 1001, 99, '01.06.2022']])
+        self.assertEqual(self.sync(self.source, self.orders), dict(inserted=4, updated=0, deleted=0))
+
+    # ......................... #
+
+    def sync(self, source: SheetSource, orders: List[List[Any]]) -> Dict[str, int]:
+        return sync_orders(source, iter_sheet_records(make_sheet(orders), page_size=3))
+
+    # ......................... #
+
+    def stored(self, source: SheetSource) -> Dict[str, Any]:
+        return dict(
+            (order.order_id, (order.index_number, order.price_USD, order.price_RUB))
+            for order in Order.objects.filter(source=source)
+        )
+
+    # ......................... #
+
+    def assertTotalsConsistent(self) -> None:
+        from django.db.models import Count, Sum
+
+        expected = dict(
+            (row['delivery_date'], (row['usd'], row['rub'], row['count']))
+            for row in Order.objects.order_by().values('delivery_date').annotate(
+                usd=Sum('price_USD'), rub=Sum('price_RUB'), count=Count('*')
+            )
+        )
+        totals = dict(
+            (total.delivery_date, (total.price_USD, total.price_RUB, total.orders))
+            for total in DailyTotal.objects.all()
+        )
+
+        self.assertEqual(totals, expected)
+
+    # ......................... #
+
+    def test_initial_sync(self) -> None:
+        self.assertEqual(self.stored(self.source)['1003'], (3, Decimal('30.00'), Decimal('1800.00')))
+        self.assertEqual(len(self.stored(self.source)), 4)
+        self.assertTotalsConsistent()
+
+    # ......................... #
+
+    def test_unchanged_sheet_is_skipped(self) -> None:
+        with self.assertNumQueries(1):
+            self.assertEqual(self.sync(self.source, self.orders), dict(inserted=0, updated=0, deleted=0))
+
+    # ......................... #
+
+    def test_changed_rows_are_updated(self) -> None:
+        self.orders[2][2] = 35
+        self.orders[3][3] = '05.06.2022'
+
+        self.assertEqual(self.sync(self.source, self.orders), dict(inserted=0, updated=2, deleted=0))
+        self.assertEqual(self.stored(self.source)['1003'], (3, Decimal('35.00'), Decimal('2100.00')))
+        self.assertEqual(Order.objects.get(source=self.source, order_id='1004').delivery_date, date(2022, 6, 5))
+        self.assertTotalsConsistent()
+
+    # ......................... #
+
+    def test_removed_rows_are_deleted(self) -> None:
+        self.assertEqual(self.sync(self.source, self.orders[:1] + self.orders[2:]), dict(inserted=0, updated=0, deleted=1))
+        self.assertNotIn('1002', self.stored(self.source))
+        self.assertTotalsConsistent()
+
+    # ......................... #
+
+    def test_renumbered_rows(self) -> None:
+        # rows swapped and one inserted above them, index numbers move between orders
+
+        orders = [[1, 1005, 50, '04.06.2022'], [2, 1002, 20, '01.06.2022'], [3, 1001, 10, '01.06.2022']] + self.orders[2:]
+        orders[3][0], orders[4][0] = 4, 5
+
+        self.assertEqual(self.sync(self.source, orders), dict(inserted=1, updated=3, deleted=0))
+        self.assertEqual(
+            dict((order_id, row[0]) for order_id, row in self.stored(self.source).items()),
+            {'1005': 1, '1002': 2, '1001': 3, '1003': 4, '1004': 5}
+        )
+        self.assertTotalsConsistent()
+
+    # ......................... #
+
+    def test_truncated_sheet_is_not_deleted(self) -> None:
+        with self.assertLogs('googlesheets.sync', 'WARNING'):
+            self.assertEqual(self.sync(self.source, self.orders[:1]), dict(inserted=0, updated=0, deleted=-1))
+
+        self.assertEqual(len(self.stored(self.source)), 4)
+
+        # refused deletion is rechecked by the next run
+
+        self.assertEqual(self.sync(self.source, self.orders[:3]), dict(inserted=0, updated=0, deleted=1))
+
+    # ......................... #
+
+    def test_empty_sheet_is_not_deleted(self) -> None:
+        with self.assertLogs('googlesheets.sync', 'WARNING'):
+            self.assertEqual(self.sync(self.source, []), dict(inserted=0, updated=0, deleted=-1))
+
+        self.assertEqual(len(self.stored(self.source)), 4)
+
+    # ......................... #
+
+    def test_other_sheets_are_not_touched(self) -> None:
+        self.sync(self.source, self.orders[:3])
+
+        self.assertEqual(self.stored(self.other), {'1001': (1, Decimal('99.00'), Decimal('5940.00'))})
+        self.assertEqual(self.stored(self.source)['1001'][1], Decimal('10.00'))
+
+# ------------------------- #
+
+@override_settings(CACHES=LOCMEM_CACHES, SHEET_SYNC_BACKEND='orm', SHEET_SYNC_CHUNK_SIZE=2)
+class OrmSheetSyncTest(SheetSyncTestMixin, TestCase):
+    pass
+
+# ------------------------- #
+
+@override_settings(CACHES=LOCMEM_CACHES, SHEET_SYNC_BACKEND='copy', SHEET_SYNC_CHUNK_SIZE=2)
+class CopySheetSyncTest(SheetSyncTestMixin, TestCase):
+    pass
+
+# ------------------------- #
+
+def make_expired_rows(count: int) -> List[Any]:
+    """
+    Build notification rows of alike orders with a few longer sheet names and order IDs.
+    """
+
+    return [
+        (pk, 'sheet' if pk % 7 else 'another-long-sheet-name', str(100000 + pk * 37), pk % 900)
+        for pk in range(1, count + 1)
+    ]
+
+# ------------------------- #
+
+class PaginateRowsTest(SimpleTestCase):
+
+    def assertPagesFit(self, rows: List[Any], pages: List[Any], limit: int) -> None:
+        self.assertEqual([row for page in pages for row in page], rows)
+
+        for index, page in enumerate(pages):
+            # row longer than limit is sent alone
+
+            if len(page) > 1:
+                self.assertLessEqual(len(notifications.render_message(page)), limit)
+
+            # every page except the last one is as long as possible
+
+            if index < len(pages) - 1:
+                self.assertGreater(len(notifications.render_message(page + pages[index + 1][:1])), limit)
+
+    # ......................... #
+
+    def test_pages_fit_message_limit(self) -> None:
+        for count in (0, 1, 50, 500):
+            for limit in (300, 1000, notifications.MESSAGE_LIMIT):
+                with self.subTest(count=count, limit=limit):
+                    rows = make_expired_rows(count)
+                    self.assertPagesFit(rows, list(notifications.paginate_rows(rows, limit)), limit)
+
+    # ......................... #
+
+    def test_row_longer_than_limit_is_sent_alone(self) -> None:
+        rows = make_expired_rows(3)
+        rows[1] = (2, 'x' * 500, '1', 1)
+
+        self.assertEqual([len(page) for page in notifications.paginate_rows(rows, 400)], [1, 1, 1])
+
+    # ......................... #
+
+    def test_renders_are_bounded(self) -> None:
+        rows = make_expired_rows(5000)
+        render = mock.Mock(wraps=notifications.render_message)
+
+        with mock.patch.object(notifications, 'render_message', render):
+            pages = list(notifications.paginate_rows(rows))
+
+        # each page is found by a few probes of at most a single message of rows
+
+        self.assertLessEqual(render.call_count, 1 + 4 * len(pages))
+        self.assertLessEqual(max(len(call.args[0]) for call in render.call_args_list), notifications.MESSAGE_LIMIT // 30)
+
+# ------------------------- #
+
+class TokenBucketTest(SimpleTestCase):
+
+    def test_burst_then_rate(self) -> None:
+        clock = dict(now=0.0)
+
+        def sleep(seconds: float) -> None:
+            clock['now'] += seconds
+
+        with mock.patch.object(notifications.time, 'monotonic', lambda: clock['now']), \
+                mock.patch.object(notifications.time, 'sleep', sleep):
+
+            bucket = notifications.TokenBucket(rate=2, capacity=3)
+
+            for _ in range(7):
+                bucket.acquire()
+
+        # 3 tokens of burst, 4 more at 2 tokens per second
+
+        self.assertAlmostEqual(clock['now'], 2.0)
+
+# ------------------------- #
+
+class FakeBotAPI(BaseHTTPRequestHandler):
+    """
+    Telegram Bot API answering requests with replies queued in `replies` (status, payload),
+    by default sendMessage succeeds and getUpdates returns `updates` starting from offset.
+    Successful calls are stored in `requests` as (method, params).
+    """
+
+    replies = list()
+    requests = list()
+    updates = list()
+
+    def do_POST(self) -> None:
+        method = self.path.rsplit('/', 1)[-1]
+        params = json.loads(self.rfile.read(int(self.headers['Content-Length'])) or b'{}')
+
+        if self.replies:
+            status, payload = self.replies.pop(0)
+        else:
+            self.requests.append((method, params))
+            status = 200
+
+            if method == 'getUpdates':
+                result = [update for update in self.updates if update['update_id'] >= int(params.get('offset') or 0)]
+            else:
+                result = dict(
+                    message_id=len(self.requests),
+                    date=0,
+                    chat=dict(id=int(params['chat_id']), type='private'),
+                    text=params['text']
+                )
+
+            payload = dict(ok=True, result=result)
+
+        body = json.dumps(payload).encode()
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    # ......................... #
+
+    @classmethod
+    def messages(cls) -> List[Dict[str, Any]]:
+        return [params for method, params in cls.requests if method == 'sendMessage']
+
+    # ......................... #
+
+    def log_message(self, *args: Any) -> None:
+        pass
+
+# ------------------------- #
+
+class FakeBotAPITestMixin:
+    """
+    Run fake Telegram Bot API server and point Telegram Bot to it.
+    """
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), FakeBotAPI)
+        Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    # ......................... #
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    # ......................... #
+
+    def setUp(self) -> None:
+        cache.clear()
+
+        FakeBotAPI.replies.clear()
+        FakeBotAPI.requests.clear()
+        FakeBotAPI.updates.clear()
+
+        token = mock.patch.dict(os.environ, TG_BOT_TOKEN='123:test')
+        token.start()
+        self.addCleanup(token.stop)
+
+        api_url = self.settings(TG_BOT_API_URL=f'http://127.0.0.1:{self.server.server_port}/bot')
+        api_url.enable()
+        self.addCleanup(api_url.disable)
+
+# ------------------------- #
+
+@override_settings(CACHES=LOCMEM_CACHES, TG_BOT_SEND_RETRIES=2, TG_BOT_SEND_BACKOFF=1)
+class SendMessageTest(FakeBotAPITestMixin, TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+
+        # no waiting for rate limiter and retries
+
+        self.sleep = mock.Mock()
+
+        for patcher in (
+            mock.patch.object(notifications.time, 'sleep', self.sleep),
+            mock.patch.object(notifications, '_bucket', notifications.TokenBucket(rate=1000, capacity=1000)),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    # ......................... #
+
+    def bot(self) -> Any:
+        import telegram
+        from django.conf import settings
+
+        return telegram.Bot(token=os.environ['TG_BOT_TOKEN'], base_url=settings.TG_BOT_API_URL)
+
+    # ......................... #
+
+    def test_retry_after_flood_control(self) -> None:
+        FakeBotAPI.replies.append((429, dict(
+            ok=False, error_code=429, description='Too Many Requests: retry after 7', parameters=dict(retry_after=7)
+        )))
+
+        with self.assertLogs('googlesheets.notifications', 'WARNING'):
+            self.assertTrue(notifications.send_message(self.bot(), '42', 'text'))
+
+        self.sleep.assert_called_once_with(7)
+        self.assertEqual(len(FakeBotAPI.messages()), 1)
+
+    # ......................... #
+
+    def test_network_errors_back_off(self) -> None:
+        FakeBotAPI.replies.extend([(502, dict(ok=False, error_code=502, description='Bad Gateway'))] * 2)
+
+        with self.assertLogs('googlesheets.notifications', 'WARNING'):
+            self.assertTrue(notifications.send_message(self.bot(), '42', 'text'))
+
+        self.assertEqual([call.args[0] for call in self.sleep.call_args_list], [1, 2])
+
+    # ......................... #
+
+    def test_retries_are_limited(self) -> None:
+        FakeBotAPI.replies.extend([(502, dict(ok=False, error_code=502, description='Bad Gateway'))] * 3)
+
+        with self.assertLogs('googlesheets.notifications', 'WARNING'):
+            self.assertFalse(notifications.send_message(self.bot(), '42', 'text'))
+
+        self.assertEqual(FakeBotAPI.messages(), [])
+
+    # ......................... #
+
+    def test_rejected_message_is_not_retried(self) -> None:
+        FakeBotAPI.replies.append((400, dict(ok=False, error_code=400, description='Bad Request: chat not found')))
+
+        with self.assertLogs('googlesheets.notifications', 'ERROR'):
+            self.assertFalse(notifications.send_message(self.bot(), '42', 'text'))
+
+        self.sleep.assert_not_called()
+
+    # ......................... #
+
+    def test_expired_orders_are_sent_by_pages(self) -> None:
+        from django.utils.timezone import now
+
+        TelegramSubscriber.objects.create(chat_id='42', subscribed_at=now())
+
+        rows = make_expired_rows(300)
+
+        # the first message is rejected, orders of other pages are sent
+
+        FakeBotAPI.replies.append((400, dict(ok=False, error_code=400, description='Bad Request: message is too long')))
+
+        with self.assertLogs('googlesheets.notifications', 'ERROR'):
+            sent = notifications.send_expired_delivery_messages(rows)
+
+        pages = list(notifications.paginate_rows(sorted(rows, key=lambda x: x[-1], reverse=True)))
+
+        self.assertGreater(len(pages), 2)
+        self.assertEqual(len(FakeBotAPI.messages()), len(pages) - 1)
+        self.assertTrue(all(message['chat_id'] == '42' and message['parse_mode'] == 'HTML' for message in FakeBotAPI.messages()))
+        self.assertTrue(all(len(message['text']) <= notifications.MESSAGE_LIMIT for message in FakeBotAPI.messages()))
+        self.assertEqual(sorted(sent), sorted(pk for page in pages[1:] for pk, *_ in page))
+
+    # ......................... #
+
+    def create_expired_orders(self, count: int) -> List[int]:
+        source = SheetSource.objects.create(name='test-sheet')
+
+        return [
+            Order.objects.create(
+                source=source,
+                order_id=str(1000 + i),
+                index_number=i,
+                delivery_date=date(2022, 6, 1),
+                price_USD=Decimal(10),
+                price_RUB=Decimal(600),
+                delivery_expired=True
+            ).pk
+            for i in range(1, count + 1)
+        ]
+
+    # ......................... #
+
+    def test_messages_are_sent_after_claim_is_committed(self) -> None:
+        from googlesheets.tasks import notify_about_expired_delivery
+
+        pks = self.create_expired_orders(3)
+        depth = len(connection.savepoint_ids)
+        send_depths = list()
+
+        def send(rows: List[Any]) -> List[int]:
+            # no transaction of the task holds claimed rows locked
+            send_depths.append(len(connection.savepoint_ids))
+            return [pks[0]]
+
+        with mock.patch.object(notifications, 'send_expired_delivery_messages', send):
+            self.assertEqual(notify_about_expired_delivery(), "expired orders claimed: 3")
+
+        self.assertEqual(send_depths, [depth])
+
+        # unsent orders are claimed again by the next run
+
+        self.assertEqual(
+            list(Order.objects.filter(notification_sent=True).values_list('pk', flat=True)),
+            [pks[0]]
+        )
+
+    # ......................... #
+
+    def test_claim_is_reset_when_sending_fails(self) -> None:
+        from googlesheets.tasks import notify_about_expired_delivery
+
+        self.create_expired_orders(3)
+
+        with mock.patch.object(notifications, 'send_expired_delivery_messages', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                notify_about_expired_delivery()
+
+        self.assertFalse(Order.objects.filter(notification_sent=True).exists())
+
+# ------------------------- #
+
+# startup of web and worker processes with network access refused or black-holed (never answered),
+# prints wall time of django.setup()
+NO_NETWORK_STARTUP = """
+import os
+import socket
+import sys
+import time
+
+def refuse(*args, **kwargs):
+    raise OSError("network access during startup")
+
+def hang(*args, **kwargs):
+    time.sleep(10)
+    raise OSError("network access during startup")
+
+socket.socket.connect = socket.socket.connect_ex = socket.getaddrinfo = hang if sys.argv[1] == 'hang' else refuse
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+
+started = time.perf_counter()
+django.setup()
+elapsed = time.perf_counter() - started
+
+from backend.wsgi import application
+from backend.celery.celery import app
+from django.urls import resolve
+
+resolve('/sheets/get-all-orders')
+
+print(elapsed)
+"""
+
+# wall time of django.setup() without network
+STARTUP_BUDGET_S = 2.0
+
+# ------------------------- #
+
+class StartupTest(SimpleTestCase):
+
+    def start(self, network: str) -> float:
+        """
+        Start app in subprocess with given network failure and get setup time.
+        """
+
+        from django.conf import settings
+
+        result = subprocess.run(
+            [sys.executable, '-c', NO_NETWORK_STARTUP, network],
+            cwd=settings.BASE_DIR,
+            capture_output=True,
+            text=True,
+            timeout=60
+        )
+
+        self.assertEqual(result.returncode, 0, result.stderr)
+
+        return float(result.stdout.split()[-1])
+
+    # ......................... #
+
+    def test_startup_with_network_refused(self) -> None:
+        self.assertLess(self.start('refuse'), STARTUP_BUDGET_S)
+
+    # ......................... #
+
+    def test_startup_with_network_black_holed(self) -> None:
+        self.assertLess(self.start('hang'), STARTUP_BUDGET_S)
+
+# ------------------------- #
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class SubscribersTest(FakeBotAPITestMixin, TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+
+        subscribers._subscriber = (None, 0.0)
+        self.addCleanup(setattr, subscribers, '_subscriber', (None, 0.0))
+
+    # ......................... #
+
+    def update(self, update_id: int, chat_id: int, text: str) -> Dict[str, Any]:
+        return dict(
+            update_id=update_id,
+            message=dict(message_id=update_id, date=1650000000 + update_id, chat=dict(id=chat_id, type='private'), text=text)
+        )
+
+    # ......................... #
+
+    def test_environment_chat_id_without_subscribers(self) -> None:
+        with mock.patch.dict(os.environ, TG_BOT_CHAT_ID='7'):
+            self.assertEqual(subscribers.get_chat_id(), '7')
+
+        with mock.patch.dict(os.environ, clear=True):
+            self.assertIsNone(subscribers.get_chat_id())
+
+    # ......................... #
+
+    def test_latest_subscriber_is_cached(self) -> None:
+        from django.utils.timezone import now
+
+        TelegramSubscriber.objects.create(chat_id='1', subscribed_at=now().replace(year=2021))
+        TelegramSubscriber.objects.create(chat_id='2', subscribed_at=now())
+
+        self.assertEqual(subscribers.get_chat_id(), '2')
+
+        # process cache, then shared cache
+
+        with self.assertNumQueries(0):
+            self.assertEqual(subscribers.get_chat_id(), '2')
+
+        subscribers._subscriber = (None, 0.0)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(subscribers.get_chat_id(), '2')
+
+    # ......................... #
+
+    def test_subscriptions_are_received(self) -> None:
+        FakeBotAPI.updates.extend([
+            self.update(10, 111, '/subscribe'),
+            self.update(11, 222, 'hello'),
+            self.update(12, 333, ' /subscribe '),
+        ])
+
+        with mock.patch.dict(os.environ, TG_BOT_CHAT_ID='7'):
+            self.assertEqual(subscribers.get_chat_id(), '7')
+
+        self.assertEqual(subscribers.refresh_subscribers(), 2)
+        self.assertEqual(sorted(TelegramSubscriber.objects.values_list('chat_id', flat=True)), ['111', '333'])
+        self.assertEqual(subscribers.get_chat_id(), '333')
+
+        # received updates are confirmed by offset of the next request
+
+        self.assertEqual(subscribers.refresh_subscribers(), 0)
+        method, params = FakeBotAPI.requests[-1]
+
+        self.assertEqual((method, int(params['offset'])), ('getUpdates', 13))
+
+# ------------------------- #
+
+# web worker entry point: application and URLconf with all views
+WEB_STARTUP = """
+from backend.wsgi import application
+from django.urls import resolve
+
+resolve('/sheets/get-all-orders')
+"""
+
+# Celery worker entry point: application with autodiscovered tasks
+WORKER_STARTUP = """
+import django
+
+django.setup()
+
+from backend.celery.celery import app
+
+app.loader.import_default_modules()
+"""
+
+# packages used only by tasks and exports
+HEAVY_PACKAGES = ('gspread', 'oauth2client', 'httplib2', 'pyasn1', 'telegram', 'prettytable', 'dateutil', 'pyarrow')
+
+# import time of entry points, measured 0.6-1 s plus about 0.3 s margin
+# (import of Sheets client stack alone takes 0.2-0.3 s)
+WEB_IMPORT_BUDGET_MS = 1300
+WORKER_IMPORT_BUDGET_MS = 1300
+
+# profiling runs, the fastest one is compared with budget to cancel out noise
+IMPORT_PROFILE_RUNS = 3
+
+# ------------------------- #
+
+def profile_imports(code: str) -> Dict[str, int]:
+    """
+    Run code in a fresh interpreter with `-X importtime`.
+
+    Modules loaded by `importlib.import_module` (apps, autodiscovered tasks) are not
+    profiled, they are taken from `sys.modules` with zero import time.
+
+    Args:
+        code (str): Python statements
+
+    Returns:
+        Dict[str, int]: own import time of every imported module in microseconds
+    """
+
+    from django.conf import settings
+
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f"{code}\nimport sys\nprint(*sys.modules, sep='\\n')"],
+        cwd=settings.BASE_DIR,
+        capture_output=True,
+        text=True,
+        timeout=60
+    )
+
+    if result.returncode != 0:
+        raise AssertionError(result.stderr)
+
+    modules = dict.fromkeys(result.stdout.split(), 0)
+
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+
+        own, _, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = int(own)
+
+    return modules
+
+# ------------------------- #
+
+class ImportTimeTest(SimpleTestCase):
+
+    def assertNotImported(self, modules: Dict[str, int], packages: Any) -> None:
+        imported = sorted(set(name.split('.')[0] for name in modules) & set(packages))
+        self.assertEqual(imported, [])
+
+    # ......................... #
+
+    def assertImportTimeLess(self, code: str, budget: int) -> None:
+        elapsed = min(sum(profile_imports(code).values()) for _ in range(IMPORT_PROFILE_RUNS)) / 1000
+        self.assertLess(elapsed, budget)
+
+    # ......................... #
+
+    def test_web_worker_imports(self) -> None:
+        modules = profile_imports(WEB_STARTUP)
+
+        self.assertIn('googlesheets.views', modules)
+        self.assertNotImported(modules, HEAVY_PACKAGES)
+        self.assertImportTimeLess(WEB_STARTUP, WEB_IMPORT_BUDGET_MS)
+
+    # ......................... #
+
+    def test_celery_worker_imports(self) -> None:
+        modules = profile_imports(WORKER_STARTUP)
+
+        self.assertIn('googlesheets.tasks', modules)
+        self.assertNotImported(modules, HEAVY_PACKAGES)
+        self.assertImportTimeLess(WORKER_STARTUP, WORKER_IMPORT_BUDGET_MS)
+
+# ------------------------- #
+
+# orders seeded for query plans, the planner prefers sequential scans on small tables
+PLAN_TEST_ROWS = 20000
+
+# ------------------------- #
+
+class QueryPlanTest(TransactionTestCase):
+    """
+    Check that the planner chooses indexes for the frequent queries with default settings
+    on table of realistic size, set SHEETS_PLAN_TEST_ROWS for larger one.
+    """
+
+    def setUp(self) -> None:
+        from datetime import timedelta
+
+        source = SheetSource.objects.create(name='plan-sheet')
+        first = date(2022, 1, 1)
+        rows = int(os.environ.get('SHEETS_PLAN_TEST_ROWS', PLAN_TEST_ROWS))
+
+        Order.objects.bulk_create(
+            (
+                Order(
+                    source=source,
+                    order_id=str(100000 + i),
+                    index_number=i,
+                    delivery_date=first + timedelta(days=i % 365),
+                    price_USD=Decimal(10),
+                    price_RUB=Decimal(600),
+                    delivery_expired=True,
+                    notification_sent=(i % (rows // 5) != 0)
+                )
+                for i in range(1, rows + 1)
+            ),
+            batch_size=10000
+        )
+
+        # statistics and visibility map as autovacuum leaves them
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"VACUUM ANALYZE {Order._meta.db_table}")
+
+    # ......................... #
+
+    def explain(self, sql: str) -> List[Dict[str, Any]]:
+        """
+        Get plan nodes of executed query.
+        """
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}")
+            plan = cursor.fetchone()[0][0]['Plan']
+
+        nodes, pending = list(), [plan]
+
+        while pending:
+            node = pending.pop()
+            nodes.append(node)
+            pending.extend(node.get('Plans', list()))
+
+        return nodes
+
+    # ......................... #
+
+    def captured(self, context: CaptureQueriesContext, marker: str) -> str:
+        return next(query['sql'] for query in context.captured_queries if marker in query['sql'])
+
+    # ......................... #
+
+    def test_claim_uses_pending_notification_index(self) -> None:
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(len(Order.objects.claim_expired_for_notification()), 5)
+
+        nodes = self.explain(self.captured(context, 'SKIP LOCKED'))
+
+        self.assertIn('order_pending_notification_idx', [node.get('Index Name') for node in nodes])
+
+    # ......................... #
+
+    def test_daily_totals_use_index_only_scan(self) -> None:
+        from googlesheets.sync import refresh_daily_totals
+
+        with CaptureQueriesContext(connection) as context:
+            refresh_daily_totals({date(2022, 1, 2), date(2022, 3, 1)})
+
+        nodes = self.explain(self.captured(context, 'SUM('))
+
+        self.assertIn(
+            ('Index Only Scan', 'order_delivery_date_price_idx'),
+            [(node['Node Type'], node.get('Index Name')) for node in nodes]
+        )
+
+# ------------------------- #
+
+class FakeRedis:
+    """
+    Redis client storing values in dict, the only registered script (lock release) is emulated in Python.
+    """
+
+    def __init__(self, store: Dict[str, Any]) -> None:
+        self.store = store
+
+    # ......................... #
+
+    def register_script(self, script: str) -> Any:
+        def release(keys: List[str], args: List[bytes]) -> int:
+            if self.store.get(keys[0]) == args[0]:
+                del self.store[keys[0]]
+                return 1
+
+            return 0
+
+        assert script == locks.RELEASE_SCRIPT
+
+        return release
+
+# ------------------------- #
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class SingleFlightTest(TestCase):
+
+    def setUp(self) -> None:
+        cache.clear()
+
+    # ......................... #
+
+    def test_overlapping_run_is_skipped(self) -> None:
+        with locks.single_flight('job', timeout=60) as acquired:
+            self.assertTrue(acquired)
+
+            with locks.single_flight('job', timeout=60) as overlapping:
+                self.assertFalse(overlapping)
+
+            with locks.single_flight('other-job', timeout=60) as other:
+                self.assertTrue(other)
+
+        with locks.single_flight('job', timeout=60) as acquired:
+            self.assertTrue(acquired)
+
+    # ......................... #
+
+    def test_lock_is_released_on_error(self) -> None:
+        with self.assertRaises(ValueError):
+            with locks.single_flight('job', timeout=60):
+                raise ValueError()
+
+        with locks.single_flight('job', timeout=60) as acquired:
+            self.assertTrue(acquired)
+
+    # ......................... #
+
+    def test_expired_lock_is_not_released_by_previous_owner(self) -> None:
+        from django.core.cache.backends import locmem
+
+        clock = dict(now=locmem.time.time())
+
+        with mock.patch.object(locmem.time, 'time', lambda: clock['now']):
+            with self.assertLogs('googlesheets.locks', 'WARNING'):
+                with locks.single_flight('job', timeout=10) as acquired:
+                    self.assertTrue(acquired)
+
+                    # the lock of a stuck run expires and is taken by the next run
+
+                    clock['now'] += 11
+                    next_run = locks.single_flight('job', timeout=10)
+                    self.assertTrue(next_run.__enter__())
+
+            with locks.single_flight('job', timeout=10) as overlapping:
+                self.assertFalse(overlapping)
+
+            next_run.__exit__(None, None, None)
+
+            with locks.single_flight('job', timeout=10) as acquired:
+                self.assertTrue(acquired)
+
+    # ......................... #
+
+    def test_runs_without_lock_if_cache_is_unavailable(self) -> None:
+        with mock.patch.object(locks.cache, 'add', side_effect=ConnectionError()):
+            with self.assertLogs('googlesheets.locks', 'WARNING'):
+                with locks.single_flight('job', timeout=60) as acquired:
+                    self.assertTrue(acquired)
+
+    # ......................... #
+
+    def test_redis_lock_is_released_by_owner_only(self) -> None:
+        from django.core.cache.backends.redis import RedisCache
+
+        backend = RedisCache('redis://127.0.0.1:1/0', dict())
+        store = dict()
+        backend._cache.get_client = lambda key=None, write=False: FakeRedis(store)
+        key = backend.make_and_validate_key('googlesheets:lock:job')
+
+        with mock.patch.object(locks, 'caches', {'default': backend}):
+            store[key] = backend._cache._serializer.dumps('owner')
+            locks.release_lock('googlesheets:lock:job', 'owner')
+            self.assertEqual(store, dict())
+
+            store[key] = backend._cache._serializer.dumps('next-owner')
+
+            with self.assertLogs('googlesheets.locks', 'WARNING'):
+                locks.release_lock('googlesheets:lock:job', 'owner')
+
+            self.assertIn(key, store)
+
+# ------------------------- #
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class OverlappingTasksTest(TestCase):
+
+    def setUp(self) -> None:
+        cache.clear()
+        rates._rates.clear()
+
+        ExchangeRate.objects.create(date=date.today(), currency='USD', rate=Decimal('60'))
+
+        self.source = SheetSource.objects.create(name='test-sheet')
+
+        for patcher in (
+            mock.patch('googlesheets.tasks.update_table_from_sheet.apply_async'),
+            mock.patch('backend.celery.celery.get_queue_depth', return_value=3),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    # ......................... #
+
+    def test_sync_overlapping_slow_sync_is_skipped(self) -> None:
+        from googlesheets.tasks import update_table_from_sheet
+
+        results = list()
+
+        def open_slow_sheet(*args: Any) -> FakeWorksheet:
+            # another run starts while the sheet is being fetched
+
+            for _ in range(3):
+                with self.assertLogs('googlesheets.tasks', 'WARNING'):
+                    results.append(update_table_from_sheet('test-sheet'))
+
+            # skipped runs enqueue nothing while the sync is running
+
+            update_table_from_sheet.apply_async.assert_not_called()
+
+            return make_sheet([[1, 1001, 10, '01.06.2022']])
+
+        with mock.patch('googlesheets.client.get_worksheet', open_slow_sheet):
+            results.append(update_table_from_sheet('test-sheet'))
+
+        self.assertEqual(results[:3], ["sync of 'test-sheet' is already running, skipped"] * 3)
+        self.assertTrue(results[3].startswith("sheet 'test-sheet' synced"))
+        self.assertEqual(Order.objects.filter(source=self.source).count(), 1)
+
+        # finished sync enqueues single run to pick up changes made meanwhile
+
+        update_table_from_sheet.apply_async.assert_called_once_with(args=('test-sheet',), countdown=mock.ANY)
+
+    # ......................... #
+
+    def test_sync_without_overlap_enqueues_nothing(self) -> None:
+        from googlesheets.tasks import update_table_from_sheet
+
+        with mock.patch('googlesheets.client.get_worksheet', return_value=make_sheet([[1, 1001, 10, '01.06.2022']])):
+            update_table_from_sheet('test-sheet')
+
+        update_table_from_sheet.apply_async.assert_not_called()
+
+    # ......................... #
+
+    def test_notification_overlapping_running_one_is_skipped(self) -> None:
+        from googlesheets.tasks import notify_about_expired_delivery
+
+        Order.objects.create(
+            source=self.source,
+            order_id='1001',
+            index_number=1,
+            delivery_date=date(2022, 6, 1),
+            price_USD=Decimal(10),
+            price_RUB=Decimal(600),
+            delivery_expired=True
+        )
+
+        with locks.single_flight('notify', timeout=60):
+            self.assertEqual(notify_about_expired_delivery(), "notification is already running, skipped")
+
+        self.assertFalse(Order.objects.get(order_id='1001').notification_sent)
+
+# ------------------------- #
+
+class CbrFeedTest(SimpleTestCase):
+    """
+    CBR daily rates feed parsing on feed fixture in XML_daily.asp format.
+    """
+
+    def setUp(self) -> None:
+        from bench.cbr import FEED_FIXTURE
+
+        with open(FEED_FIXTURE, 'rb') as file:
+            self.data = file.read()
+
+    # ......................... #
+
+    def test_rates_are_per_unit(self) -> None:
+        from googlesheets.cbr import parse_daily_rates
+
+        rates_date, rates = parse_daily_rates(io.BytesIO(self.data), ['USD', 'JPY', 'VND'])
+
+        self.assertEqual(rates_date, date(2026, 10, 17))
+        self.assertEqual(rates['USD'], Decimal('60.5'))
+
+        # rates of currencies quoted per 100 and 10000 units
+
+        self.assertEqual(rates['JPY'], Decimal('40.8784') / 100)
+        self.assertEqual(rates['VND'], Decimal('25.2083') / 10000)
+
+    # ......................... #
+
+    def test_missing_currency_is_logged(self) -> None:
+        from googlesheets.cbr import parse_daily_rates
+
+        with self.assertLogs('googlesheets.cbr', 'WARNING'):
+            _, rates = parse_daily_rates(io.BytesIO(self.data), ['USD', 'XXX'])
+
+        self.assertEqual(set(rates), {'USD'})
+
+# ------------------------- #
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ResponseCacheTest(TestCase):
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.source = SheetSource.objects.create(name='test-sheet')
+        self.add_order(1)
+
+    # ......................... #
+
+    def add_order(self, index_number: int) -> None:
+        Order.objects.create(
+            source=self.source,
+            order_id=str(1000 + index_number),
+            index_number=index_number,
+            delivery_date=date(2022, 6, 1),
+            price_USD=Decimal(10),
+            price_RUB=Decimal(600),
+            delivery_expired=False
+        )
+
+    # ......................... #
+
+    def test_cached_until_version_changes(self) -> None:
+        from googlesheets.cache import bump_data_version
+
+        first = self.client.get('/sheets/get-all-orders')
+        self.assertEqual(first['X-Cache'], 'miss')
+        self.assertEqual(self.client.get('/sheets/get-all-orders')['X-Cache'], 'local')
+
+        not_modified = self.client.get('/sheets/get-all-orders', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+
+        self.add_order(2)
+        bump_data_version()
+
+        second = self.client.get('/sheets/get-all-orders')
+        self.assertEqual(len(json.loads(second.content)), 2)
+        self.assertNotEqual(second['ETag'], first['ETag'])
+
+    # ......................... #
+
+    def test_lost_version_does_not_serve_stale_response(self) -> None:
+        first = self.client.get('/sheets/get-all-orders')
+
+        # cache restart loses data version, orders change meanwhile
+
+        cache.clear()
+        self.add_order(2)
+
+        second = self.client.get('/sheets/get-all-orders', HTTP_IF_NONE_MATCH=first['ETag'])
+
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second['X-Cache'], 'miss')
+        self.assertEqual(len(json.loads(second.content)), 2)
+        self.assertNotEqual(second['ETag'], first['ETag'])
+
+# ------------------------- #
+
+class OrderSerializationTest(TestCase):
+    """
+    Fast-path serialization is byte-identical to DRF serializer rendered by JSONRenderer.
+    """
+
+    def setUp(self) -> None:
+        source = SheetSource.objects.create(name='лист заказов')
+
+        for index_number, order_id, price_USD, price_RUB, delivery_date, order_source in (
+            (1, '1001', Decimal('10.00'), Decimal('605.00'), date(2022, 6, 1), source),
+            (2, 'заказ №2 «срочно»', Decimal('1234567.05'), Decimal('74691308.53'), date(1999, 12, 31), source),
+            (3, '1003', Decimal('0.10'), Decimal('6.05'), date(2022, 1, 9), None),
+        ):
+            Order.objects.create(
+                source=order_source,
+                order_id=order_id,
+                index_number=index_number,
+                delivery_date=delivery_date,
+                price_USD=price_USD,
+                price_RUB=price_RUB,
+                delivery_expired=False
+            )
+
+    # ......................... #
+
+    def assertSameAsSerializer(self) -> None:
+        from googlesheets.serializers import OrderSerializer, dump_json, iter_order_rows
+        from rest_framework.renderers import JSONRenderer
+
+        queryset = Order.objects.all()
+        expected = JSONRenderer().render(OrderSerializer(queryset, many=True).data)
+
+        self.assertEqual(dump_json(list(iter_order_rows(queryset))), expected)
+        self.assertEqual(dump_json(list(iter_order_rows(queryset, chunk_size=2))), expected)
+
+    # ......................... #
+
+    def test_output_equals_serializer(self) -> None:
+        self.assertSameAsSerializer()
+
+    # ......................... #
+
+    def test_output_equals_serializer_without_orjson(self) -> None:
+        from googlesheets import serializers
+
+        with mock.patch.object(serializers, 'orjson', None):
+            self.assertSameAsSerializer()
+
+    # ......................... #
+
+    def test_output_equals_serializer_with_float_decimals(self) -> None:
+        from django.conf import settings
+
+        with self.settings(REST_FRAMEWORK=dict(settings.REST_FRAMEWORK, COERCE_DECIMAL_TO_STRING=False)):
+            self.assertSameAsSerializer()
+
+# ------------------------- #
+
+def create_orders(source: SheetSource, orders: List[List[Any]]) -> None:
+    """
+    Create orders given as index number, USD price and delivery date with RUB price at rate 60.
+    """
+
+    Order.objects.bulk_create(
+        Order(
+            source=source,
+            order_id=f'{source.pk}-{index_number}',
+            index_number=index_number,
+            delivery_date=delivery_date,
+            price_USD=Decimal(price_USD),
+            price_RUB=Decimal(price_USD) * 60,
+            delivery_expired=False
+        )
+        for index_number, price_USD, delivery_date in orders
+    )
+
+# ------------------------- #
+
+@override_settings(CACHES=LOCMEM_CACHES, SHEETS_PAGE_MAX_LIMIT=10)
+class OrdersPageTest(TestCase):
+
+    def setUp(self) -> None:
+        cache.clear()
+
+        for name in ('first-sheet', 'second-sheet'):
+            create_orders(
+                SheetSource.objects.create(name=name),
+                [[index_number, 10, date(2022, 6, 1)] for index_number in (5, 1, 4, 2, 3)]
+            )
+
+    # ......................... #
+
+    def test_cursor_walks_all_orders(self) -> None:
+        params, pages = dict(limit=3), list()
+
+        while True:
+            response = self.client.get('/sheets/get-all-orders', params)
+            self.assertEqual(response.status_code, 200)
+
+            page = json.loads(response.content)
+            pages.append(page['results'])
+
+            if page['next'] is None:
+                break
+
+            params['after'] = page['next']
+
+        self.assertEqual([len(page) for page in pages], [3, 3, 3, 1])
+        self.assertEqual(
+            [order for page in pages for order in page],
+            json.loads(self.client.get('/sheets/get-all-orders').content)
+        )
+        self.assertEqual(
+            [(order['source'], order['index_number']) for page in pages for order in page],
+            list(Order.objects.order_by('source_id', 'index_number').values_list('source_id', 'index_number'))
+        )
+
+    # ......................... #
+
+    def test_last_full_page_has_no_cursor(self) -> None:
+        page = json.loads(self.client.get('/sheets/get-all-orders', dict(limit=10)).content)
+
+        self.assertEqual(len(page['results']), 10)
+        self.assertIsNone(page['next'])
+
+    # ......................... #
+
+    def test_invalid_parameters(self) -> None:
+        for params in (
+            dict(limit='ten'),
+            dict(limit=0),
+            dict(limit=11),
+            dict(limit=3, after='5'),
+            dict(limit=3, after='first:5'),
+            dict(limit=3, after='1:2:3'),
+        ):
+            with self.subTest(**params):
+                response = self.client.get('/sheets/get-all-orders', params)
+
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('limit', json.loads(response.content)['detail'])
+
+# ------------------------- #
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ExportTest(TransactionTestCase):
+    """
+    Export of orders, data is committed as streamed export is written by separate thread and connection.
+    """
+
+    def setUp(self) -> None:
+        create_orders(
+            SheetSource.objects.create(name='test-sheet'),
+            [[1, '10.50', date(2022, 6, 1)], [2, 20, date(2022, 6, 2)], [3, 30, date(2022, 6, 3)]]
+        )
+
+    # ......................... #
+
+    def export(self, extension: str, **params: Any) -> bytes:
+        response = self.client.get(f'/sheets/export/orders.{extension}', params)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(f'filename="orders.{extension}"', response['Content-Disposition'])
+
+        return b''.join(response.streaming_content)
+
+    # ......................... #
+
+    def expected_rows(self, **filters: Any) -> List[Dict[str, Any]]:
+        from googlesheets.serializers import OrderSerializer
+
+        queryset = Order.objects.filter(**filters).order_by('source_id', 'index_number')
+
+        return [dict(row) for row in OrderSerializer(queryset, many=True).data]
+
+    # ......................... #
+
+    def test_csv_columns_are_named_as_orders_fields(self) -> None:
+        import csv
+        from googlesheets.export import EXPORT_FIELDS
+
+        rows = list(csv.DictReader(io.StringIO(self.export('csv').decode())))
+
+        self.assertEqual(tuple(rows[0]), EXPORT_FIELDS)
+        self.assertEqual(rows, [
+            dict((name, str(value)) for name, value in row.items())
+            for row in self.expected_rows()
+        ])
+
+    # ......................... #
+
+    def test_date_range_filter(self) -> None:
+        import csv
+
+        rows = list(csv.DictReader(io.StringIO(self.export('csv', **{'from': '2022-06-02', 'to': '2022-06-02'}).decode())))
+        self.assertEqual([row['index_number'] for row in rows], ['2'])
+
+        rows = list(csv.DictReader(io.StringIO(self.export('csv', **{'from': '2022-06-02'}).decode())))
+        self.assertEqual([row['index_number'] for row in rows], ['2', '3'])
+
+        response = self.client.get('/sheets/export/orders.csv', {'to': '02.06.2022'})
+        self.assertEqual(response.status_code, 400)
+
+    # ......................... #
+
+    def test_unknown_format(self) -> None:
+        self.assertEqual(self.client.get('/sheets/export/orders.xlsx').status_code, 404)
+
+    # ......................... #
+
+    def test_arrow_and_parquet(self) -> None:
+        from importlib.util import find_spec
+
+        if find_spec('pyarrow') is None:
+            self.skipTest('pyarrow is not installed')
+
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        from googlesheets.export import EXPORT_FIELDS
+
+        # typed columns instead of serialized strings
+
+        expected = [
+            dict(
+                row,
+                price_USD=Decimal(row['price_USD']),
+                price_RUB=Decimal(row['price_RUB']),
+                delivery_date=date.fromisoformat(row['delivery_date'])
+            )
+            for row in self.expected_rows(delivery_date__lte=date(2022, 6, 2))
+        ]
+
+        for table in (
+            pa.ipc.open_stream(self.export('arrow', to='2022-06-02')).read_all(),
+            pq.read_table(io.BytesIO(self.export('parquet', to='2022-06-02'))),
+        ):
+            self.assertEqual(tuple(table.column_names), EXPORT_FIELDS)
+            self.assertEqual(table.to_pylist(), expected)
+
+    # ......................... #
+
+    def test_spooled_export_in_async_deployment(self) -> None:
+        streamed = self.export('csv')
+
+        with self.settings(SHEETS_ASYNC_VIEWS=True):
+            self.assertEqual(self.export('csv'), streamed)
+
+# ------------------------- #
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class AggregatePriceTest(TestCase):
+
+    def setUp(self) -> None:
+        from googlesheets.sync import refresh_daily_totals
+
+        cache.clear()
+
+        # Monday, Wednesday of the same week, next Monday and Friday of July
+
+        create_orders(SheetSource.objects.create(name='test-sheet'), [
+            [1, 10, date(2022, 5, 30)],
+            [2, 15, date(2022, 6, 1)],
+            [3, 5, date(2022, 6, 1)],
+            [4, 30, date(2022, 6, 6)],
+            [5, 40, date(2022, 7, 15)],
+        ])
+        refresh_daily_totals()
+
+    # ......................... #
+
+    def aggregate(self, **params: Any) -> Dict[str, float]:
+        response = self.client.get('/sheets/get-aggregate-price', params)
+        self.assertEqual(response.status_code, 200)
+
+        return json.loads(response.content)
+
+    # ......................... #
+
+    def test_running_totals_by_granularity(self) -> None:
+        for granularity, expected in (
+            ('day', {'30.05.2022': 10, '01.06.2022': 30, '06.06.2022': 60, '15.07.2022': 100}),
+            ('week', {'30.05.2022': 30, '06.06.2022': 60, '11.07.2022': 100}),
+            ('month', {'01.05.2022': 10, '01.06.2022': 60, '01.07.2022': 100}),
+        ):
+            with self.subTest(granularity=granularity):
+                result = self.aggregate(currency='usd', granularity=granularity)
+
+                # chronological order of buckets
+                self.assertEqual(list(result.items()), list(expected.items()))
+
+        self.assertEqual(
+            self.aggregate(currency='rub', granularity='month'),
+            {'01.05.2022': 600, '01.06.2022': 3600, '01.07.2022': 6000}
+        )
+
+    # ......................... #
+
+    def test_total_before_range_is_baseline(self) -> None:
+        self.assertEqual(
+            self.aggregate(currency='usd', granularity='month', **{'from': '2022-06-01'}),
+            {'01.06.2022': 60, '01.07.2022': 100}
+        )
+        self.assertEqual(
+            self.aggregate(currency='usd', **{'from': '2022-06-02', 'to': '2022-06-30'}),
+            {'06.06.2022': 60}
+        )
+
+        # range without orders
+
+        self.assertEqual(self.aggregate(currency='usd', **{'from': '2022-08-01'}), {})
+
+    # ......................... #
+
+    def test_invalid_parameters(self) -> None:
+        for params in (
+            dict(),
+            dict(currency='eur'),
+            dict(currency='usd', granularity='year'),
+            {'currency': 'usd', 'from': '01.06.2022'},
+        ):
+            with self.subTest(**params):
+                self.assertEqual(self.client.get('/sheets/get-aggregate-price', params).status_code, 400)
+
+# ------------------------- #
+
+@override_settings(CACHES=LOCMEM_CACHES, SHEET_SYNC_CHUNK_SIZE=2)
+class ExchangeRateTest(TestCase):
+
+    def setUp(self) -> None:
+        cache.clear()
+        rates._rates.clear()
+
+        ExchangeRate.objects.create(date=date(2022, 6, 1), currency='USD', rate=Decimal('60'))
+
+        self.source = SheetSource.objects.create(name='test-sheet')
+
+    # ......................... #
+
+    def assertStampedWith(self, rate: Decimal) -> None:
+        from django.db.models import Sum
+
+        for order in Order.objects.all():
+            self.assertEqual(order.exchange_rate, rate)
+            self.assertEqual(order.price_RUB, (order.price_USD * rate).quantize(Decimal('0.01')))
+
+        # daily totals follow recalculated prices
+
+        self.assertEqual(
+            DailyTotal.objects.aggregate(total=Sum('price_RUB'))['total'],
+            Order.objects.aggregate(total=Sum('price_RUB'))['total']
+        )
+
+    # ......................... #
+
+    def test_stale_orders_are_recalculated(self) -> None:
+        from googlesheets.sync import refresh_daily_totals
+
+        create_orders(self.source, [
+            [1, '10.33', date(2022, 6, 1)],
+            [2, 20, date(2022, 6, 2)],
+            [3, 30, date(2022, 6, 3)],
+        ])
+        Order.objects.filter(index_number=1).update(exchange_rate=Decimal('61.5'))
+        Order.objects.filter(index_number=2).update(exchange_rate=Decimal('60'))
+
+        # orders without rate and with other rate
+
+        self.assertEqual(rates.apply_exchange_rate(Decimal('61.5')), 2)
+        self.assertEqual(rates.apply_exchange_rate(Decimal('61.5')), 0)
+
+        # price 10.33 is not recalculated, it has been stamped with the rate already
+
+        self.assertEqual(Order.objects.get(index_number=1).price_RUB, Decimal('619.80'))
+
+        Order.objects.filter(index_number=1).update(exchange_rate=None)
+        rates.apply_exchange_rate(Decimal('61.5'))
+        refresh_daily_totals()
+
+        self.assertStampedWith(Decimal('61.5'))
+
+    # ......................... #
+
+    def test_rate_changed_during_sync_is_applied(self) -> None:
+        sheet = make_sheet([
+            [1, 1001, 10, '01.06.2022'],
+            [2, 1002, '10.33', '01.06.2022'],
+            [3, 1003, 30, '02.06.2022'],
+        ])
+
+        def records() -> Any:
+            for number, record in enumerate(iter_sheet_records(sheet, page_size=3)):
+                yield record
+
+                # rate update of other process is applied before rows of this run are written
+
+                if number == 0:
+                    rates.store_exchange_rate('USD', Decimal('62.25'), date(2022, 6, 2))
+                    rates.apply_exchange_rate(Decimal('62.25'))
+
+        sync_orders(self.source, records())
+
+        self.assertStampedWith(Decimal('62.25'))
+
+# ------------------------- #
+
+@override_settings(CACHES=LOCMEM_CACHES, SHEET_SYNC_WEBHOOK_TOKEN='secret', SHEET_SYNC_DEBOUNCE_SECONDS=5)
+class SyncTriggerTest(TestCase):
+
+    def setUp(self) -> None:
+        cache.clear()
+
+        SheetSource.objects.create(name='test-sheet')
+        SheetSource.objects.create(name='disabled-sheet', enabled=False)
+
+        patcher = mock.patch('googlesheets.tasks.update_table_from_sheet.apply_async')
+        self.apply_async = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    # ......................... #
+
+    def trigger(self, sheet: str = 'test-sheet', **headers: str) -> Any:
+        headers.setdefault('HTTP_AUTHORIZATION', 'Bearer secret')
+        return self.client.post(f'/sheets/sync-trigger?sheet={sheet}', **headers)
+
+    # ......................... #
+
+    def test_invalid_token_is_forbidden(self) -> None:
+        for headers in (
+            dict(HTTP_AUTHORIZATION=''),
+            dict(HTTP_AUTHORIZATION='Bearer wrong'),
+            dict(HTTP_AUTHORIZATION='secret'),
+            dict(HTTP_AUTHORIZATION='', HTTP_X_GOOG_CHANNEL_TOKEN='wrong'),
+        ):
+            with self.subTest(**headers):
+                self.assertEqual(self.trigger(**headers).status_code, 403)
+
+        # webhook is disabled without configured token
+
+        with self.settings(SHEET_SYNC_WEBHOOK_TOKEN=''):
+            self.assertEqual(self.trigger(HTTP_AUTHORIZATION='Bearer ').status_code, 403)
+
+        self.apply_async.assert_not_called()
+
+    # ......................... #
+
+    def test_only_post_is_allowed(self) -> None:
+        response = self.client.get('/sheets/sync-trigger', HTTP_AUTHORIZATION='Bearer secret')
+
+        self.assertEqual(response.status_code, 405)
+        self.apply_async.assert_not_called()
+
+    # ......................... #
+
+    def test_unknown_or_disabled_sheet(self) -> None:
+        self.assertEqual(self.trigger('unknown-sheet').status_code, 404)
+        self.assertEqual(self.trigger('disabled-sheet').status_code, 404)
+
+        self.apply_async.assert_not_called()
+
+    # ......................... #
+
+    def test_burst_is_coalesced_into_single_sync(self) -> None:
+        from googlesheets.triggers import clear_sync_request
+
+        responses = [self.trigger() for _ in range(4)]
+        responses.append(self.trigger(HTTP_AUTHORIZATION='', HTTP_X_GOOG_CHANNEL_TOKEN='secret'))
+
+        self.assertEqual([response.status_code for response in responses], [202] * 5)
+        self.assertEqual([json.loads(response.content)['queued'] for response in responses], [True] + [False] * 4)
+        self.apply_async.assert_called_once_with(args=('test-sheet',), countdown=5)
+
+        # changes notified after the sync has started need another one
+
+        clear_sync_request('test-sheet')
+
+        self.assertTrue(json.loads(self.trigger().content)['queued'])
+        self.assertEqual(self.apply_async.call_count, 2)
+
+# ------------------------- #
+
+class ExpireDeliveriesTest(TestCase):
+
+    def setUp(self) -> None:
+        from datetime import timedelta
+
+        self.today = date(2022, 6, 10)
+        self.source = SheetSource.objects.create(name='test-sheet')
+
+        create_orders(self.source, [
+            [1, 10, self.today - timedelta(days=30)],
+            [2, 10, self.today - timedelta(days=1)],
+            [3, 10, self.today],
+            [4, 10, self.today + timedelta(days=1)],
+        ])
+
+        # already expired and notified order is not touched
+        Order.objects.filter(index_number=1).update(delivery_expired=True, notification_sent=True)
+
+    # ......................... #
+
+    def expired(self) -> List[int]:
+        return list(Order.objects.filter(delivery_expired=True).values_list('index_number', flat=True))
+
+    # ......................... #
+
+    def test_delivery_date_reached_is_expired(self) -> None:
+        self.assertEqual(Order.objects.expire_deliveries(self.today), 2)
+        self.assertEqual(self.expired(), [1, 2, 3])
+        self.assertEqual(Order.objects.expire_deliveries(self.today), 0)
+
+        self.assertEqual(
+            list(Order.objects.filter(notification_sent=True).values_list('index_number', flat=True)),
+            [1]
+        )
+
+    # ......................... #
+
+    def test_task_uses_current_date(self) -> None:
+        from datetime import datetime, timezone
+        from googlesheets.tasks import expire_deliveries
+
+        with mock.patch('googlesheets.tasks.now', return_value=datetime(2022, 6, 11, 0, 5, tzinfo=timezone.utc)):
+            self.assertEqual(expire_deliveries(), "delivery expired for 3 orders")
+
+        self.assertEqual(self.expired(), [1, 2, 3, 4])
+
+    # ......................... #
+
+    def test_sync_expires_by_the_same_boundary(self) -> None:
+        from datetime import datetime, timezone
+        from googlesheets.sync import preprocess_rows
+
+        records = [
+            dict(index_number=number, order_id=str(number), price_USD='10', delivery_date=delivery_date)
+            for number, delivery_date in ((2, '09.06.2022'), (3, '10.06.2022'), (4, '11.06.2022'))
+        ]
+
+        with mock.patch('googlesheets.sync.now', return_value=datetime(2022, 6, 10, 12, tzinfo=timezone.utc)):
+            rows = preprocess_rows(records, Decimal('60'))
+
+        self.assertEqual([row['delivery_expired'] for row in rows], [True, True, False])
@@ -0,0 +1,121 @@
+import hmac
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpRequest
+
+# ------------------------- #
+
+logger = logging.getLogger(__name__)
+
+SYNC_PENDING_KEY_PREFIX = 'googlesheets:sync-pending'
+SYNC_FOLLOWUP_KEY_PREFIX = 'googlesheets:sync-followup'
+
+# ------------------------- #
+
+def is_authorized_trigger(request: HttpRequest) -> bool:
+    """
+    Check webhook token sent by sheet change trigger as bearer token
+    or as channel token of Google Drive push notification.
+
+    Args:
+        request (HttpRequest): trigger request
+
+    Returns:
+        bool: True if the token matches SHEET_SYNC_WEBHOOK_TOKEN (webhook is disabled without it)
+    """
+
+    expected = settings.SHEET_SYNC_WEBHOOK_TOKEN
+
+    if not expected:
+        return False
+
+    authorization = request.headers.get('Authorization', '')
+    token = request.headers.get('X-Goog-Channel-Token', '')
+
+    if authorization.startswith('Bearer '):
+        token = authorization[len('Bearer '):]
+
+    return hmac.compare_digest(token.encode(), expected.encode())
+
+# ------------------------- #
+
+def request_sync(sheet_name: str) -> bool:
+    """
+    Enqueue sync of sheet delayed by SHEET_SYNC_DEBOUNCE_SECONDS,
+    requests made while sync is pending are coalesced into it.
+
+    Args:
+        sheet_name (str): Google Sheet name
+
+    Returns:
+        bool: True if new sync was enqueued, False if pending one covers the request
+    """
+
+    from googlesheets.tasks import update_table_from_sheet
+
+    debounce = settings.SHEET_SYNC_DEBOUNCE_SECONDS
+
+    # pending flag outlives countdown in case the worker is busy, sync clears it on start
+    if not cache.add(f'{SYNC_PENDING_KEY_PREFIX}:{sheet_name}', 1, timeout=debounce * 4):
+        return False
+
+    update_table_from_sheet.apply_async(args=(sheet_name,), countdown=debounce)
+
+    logger.info(f"sync of '{sheet_name}' enqueued in {debounce} s")
+
+    return True
+
+# ------------------------- #
+
+def clear_sync_request(sheet_name: str) -> None:
+    """
+    Clear pending sync flag, so changes made during sync enqueue the next one.
+
+    Args:
+        sheet_name (str): Google Sheet name
+    """
+
+    try:
+        cache.delete(f'{SYNC_PENDING_KEY_PREFIX}:{sheet_name}')
+    except Exception as error:
+        logger.warning(f"cache backend unavailable: {error}")
+
+# ------------------------- #
+
+def request_followup_sync(sheet_name: str) -> None:
+    """
+    Ask running sync of sheet to enqueue one more sync when it finishes,
+    runs skipped during the sync are coalesced into it.
+
+    Args:
+        sheet_name (str): Google Sheet name
+    """
+
+    try:
+        cache.set(f'{SYNC_FOLLOWUP_KEY_PREFIX}:{sheet_name}', 1, timeout=settings.SHEET_SYNC_LOCK_TIMEOUT)
+    except Exception as error:
+        logger.warning(f"cache backend unavailable: {error}")
+
+# ------------------------- #
+
+def pop_followup_sync(sheet_name: str) -> bool:
+    """
+    Clear follow-up sync request of sheet.
+
+    Args:
+        sheet_name (str): Google Sheet name
+
+    Returns:
+        bool: True if follow-up sync was requested
+    """
+
+    try:
+        # deletion reports whether the key existed, so concurrent request is not lost
+        return cache.delete(f'{SYNC_FOLLOWUP_KEY_PREFIX}:{sheet_name}')
+    except Exception as error:
+        logger.warning(f"cache backend unavailable: {error}")
+        return False
+
+# ------------------------- #
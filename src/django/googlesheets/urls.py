@@ -1,13 +1,30 @@
+from django.conf import settings
 from django.urls import include, path
 
-from googlesheets.views import *
+from googlesheets import views
 
 # ------------------------- #
 
 urlpatterns = [
-    path('get-all-orders', get_all_orders, name='get-all-orders'),
-    path('get-accum-price/usd', get_accum_price_usd_in_time, name='get-accum-price-usd'),
-    path('get-accum-price/rub', get_accum_price_rub_in_time, name='get-accum-price-rub'),
-    path('get-total-price/usd', get_total_price_usd, name='get-total-price-usd'),
-    path('get-total-price/rub', get_total_price_rub, name='get-total-price-rub'),
-]
\ No newline at end of file
+    path('get-all-orders', views.get_all_orders, name='get-all-orders'),
+    path('get-all-orders/stream', views.stream_all_orders, name='get-all-orders-stream'),
+    path('get-accum-price/usd', views.get_accum_price_usd_in_time, name='get-accum-price-usd'),
+    path('get-accum-price/rub', views.get_accum_price_rub_in_time, name='get-accum-price-rub'),
+    path('get-total-price/usd', views.get_total_price_usd, name='get-total-price-usd'),
+    path('get-total-price/rub', views.get_total_price_rub, name='get-total-price-rub'),
+    path('get-aggregate-price', views.get_aggregate_price, name='get-aggregate-price'),
+    path('sync-trigger', views.trigger_sync, name='sync-trigger'),
+    path('export/orders.<str:extension>', views.export_orders, name='export-orders'),
+]
+
+# native async read endpoints for ASGI deployment take precedence over sync ones
+if settings.SHEETS_ASYNC_VIEWS:
+    urlpatterns = [
+        path('get-all-orders', views.get_all_orders_async, name='get-all-orders'),
+        path('get-all-orders/stream', views.stream_all_orders_async, name='get-all-orders-stream'),
+        path('get-accum-price/usd', views.get_accum_price_in_time_async, dict(currency="USD"), name='get-accum-price-usd'),
+        path('get-accum-price/rub', views.get_accum_price_in_time_async, dict(currency="RUB"), name='get-accum-price-rub'),
+        path('get-total-price/usd', views.get_total_price_async, dict(currency="USD"), name='get-total-price-usd'),
+        path('get-total-price/rub', views.get_total_price_async, dict(currency="RUB"), name='get-total-price-rub'),
+        path('get-aggregate-price', views.get_aggregate_price_async, name='get-aggregate-price'),
+    ] + urlpatterns
\ No newline at end of file
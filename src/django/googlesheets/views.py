@@ -1,41 +1,260 @@
 import logging
 
-from django.db.models import Sum
+from asgiref.sync import sync_to_async
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from django.conf import settings
+from decimal import Decimal
+from django.db import close_old_connections
+from django.db.models import F, Q, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+from django.http import (
+    FileResponse, Http404, HttpRequest, HttpResponse, HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
+)
+from django.views.decorators.http import require_GET
 from rest_framework import status
 from rest_framework.decorators import api_view
 from rest_framework.request import Request
 from rest_framework.response import Response
-from typing import Dict
-
-from googlesheets.models import Order
-from googlesheets.serializers import OrderSerializer
+from functools import partial, wraps
+from importlib.util import find_spec
+from typing import IO, Any, Callable, Dict, Iterator, Optional, Tuple
+
+from backend.dbmetrics import track_queries
+from googlesheets.cache import cached_view
+from googlesheets.export import export_arrow, export_csv, iter_export, spooled_file
+from googlesheets.models import DailyTotal, Order, SheetSource
+from googlesheets.reader import iter_chunks
+from googlesheets.serializers import dump_json, iter_order_rows
+from googlesheets.triggers import is_authorized_trigger, request_sync
 
 # ------------------------- #
 
 logger = logging.getLogger(__name__)
 
+# delivery date bucket expressions by granularity
+GRANULARITY_BUCKETS = dict(
+    day=F('delivery_date'),
+    week=TruncWeek('delivery_date'),
+    month=TruncMonth('delivery_date')
+)
+
+# ------------------------- #
+
+def parse_page(request: HttpRequest) -> Tuple[int, Optional[Tuple[int, int]]]:
+    """
+    Parse `limit` and optional `after` pagination query parameters.
+
+    Raises:
+        ValueError: invalid pagination parameters
+
+    Returns:
+        Tuple[int, Optional[Tuple[int, int]]]: page size and source ID with index number
+            of the last object of the previous page
+    """
+
+    try:
+        limit = int(request.GET['limit'])
+        after = None
+
+        if 'after' in request.GET:
+            source_id, index_number = request.GET['after'].split(':')
+            after = int(source_id), int(index_number)
+
+    except ValueError:
+        raise ValueError("limit must be integer and after must be next value of the previous page")
+
+    if not 0 < limit <= settings.SHEETS_PAGE_MAX_LIMIT:
+        raise ValueError(f"limit must be between 1 and {settings.SHEETS_PAGE_MAX_LIMIT}")
+
+    return limit, after
+
 # ------------------------- #
 
+def get_orders_page(limit: int, after: Optional[Tuple[int, int]] = None) -> Dict[str, Any]:
+    """
+    Get single page of serialized objects from Order table paginated by source and index number.
+
+    Args:
+        limit (int): page size
+        after (Optional[Tuple[int, int]], optional): source ID and index number
+            of the last object of the previous page. Defaults to None.
+
+    Returns:
+        Dict[str, Any]: page objects and cursor to request the next page with (None for the last page)
+    """
+
+    queryset = Order.objects.order_by('source_id', 'index_number')
+
+    if after is not None:
+        source_id, index_number = after
+        queryset = queryset.filter(Q(source_id__gt=source_id) | Q(source_id=source_id, index_number__gt=index_number))
+
+    page = list(iter_order_rows(queryset[:limit + 1]))
+    last = page[limit - 1] if len(page) > limit else None
+
+    return dict(
+        next=f"{last['source']}:{last['index_number']}" if last is not None else None,
+        results=page[:limit]
+    )
+
+# ------------------------- #
+
+@cached_view
 @api_view(http_method_names=['GET'])
-def get_all_orders(request: Request) -> Response:
+def get_all_orders(request: Request) -> HttpResponse:
     """
     Retrieve all objects in serialized form from Order table. 
 
+    With `limit` query parameter objects are paginated by source and index number,
+    `after` parameter takes `"<source>:<index_number>"` cursor returned as `next` by the previous page.
+
     Returns:
-        Response:
+        HttpResponse:
+            200: all objects from Order table or single page
+            400: invalid pagination parameters
+    """
+
+    if 'limit' not in request.query_params:
+        data = list(iter_order_rows(Order.objects.all()))
+
+        return HttpResponse(dump_json(data), status=status.HTTP_200_OK, content_type='application/json')
+
+    # keyset pagination
+
+    try:
+        limit, after = parse_page(request)
+    except ValueError as error:
+        return Response(status=status.HTTP_400_BAD_REQUEST, data={"detail": str(error)})
+
+    data = get_orders_page(limit, after)
+
+    return HttpResponse(dump_json(data), status=status.HTTP_200_OK, content_type='application/json')
+
+# ------------------------- #
+
+def iter_orders_json() -> Iterator[bytes]:
+    """
+    Encode all objects from Order table as JSON array by chunks fetched from server-side cursor.
+
+    Yields:
+        Iterator[bytes]: encoded array parts
+    """
+
+    rows = iter_order_rows(Order.objects.all(), chunk_size=settings.SHEETS_STREAM_CHUNK_SIZE)
+    separator = b''
+
+    yield b'['
+
+    for chunk in iter_chunks(rows, settings.SHEETS_STREAM_CHUNK_SIZE):
+        # strip brackets of encoded chunk array
+        yield separator + dump_json(chunk)[1:-1]
+        separator = b','
+
+    yield b']'
+
+# ------------------------- #
+
+@require_GET
+def stream_all_orders(request: HttpRequest) -> StreamingHttpResponse:
+    """
+    Stream all objects from Order table as JSON array using server-side cursor,
+    memory usage does not depend on table size.
+
+    Returns:
+        StreamingHttpResponse:
             200: all objects from Order table
     """
 
-    queryset = Order.objects.all()
-    serializer = OrderSerializer(queryset, many=True)
+    return StreamingHttpResponse(iter_orders_json(), content_type='application/json')
+
+# ------------------------- #
 
-    return Response(status=status.HTTP_200_OK, data=serializer.data)
+def get_date_range(request: HttpRequest) -> Tuple[Optional[date], Optional[date]]:
+    """
+    Parse optional `from` and `to` delivery date query parameters in ISO format.
+
+    Raises:
+        ValueError: invalid date format
+
+    Returns:
+        Tuple[Optional[date], Optional[date]]: first and last delivery dates (inclusive)
+    """
+
+    return tuple(
+        date.fromisoformat(request.GET[name]) if request.GET.get(name) else None
+        for name in ('from', 'to')
+    )
+
+# ------------------------- #
+
+@require_GET
+def export_orders(request: HttpRequest, extension: str) -> HttpResponse:
+    """
+    Export objects from Order table as CSV, Apache Arrow IPC stream or Parquet file,
+    optionally filtered by `from` and `to` delivery dates.
+
+    Export is streamed while it is written. ASGI handler of Django 4.0 iterates streaming
+    content inside event loop, so in ASGI deployment the export is spooled into temporary file first.
+
+    Returns:
+        HttpResponse:
+            200: exported file
+            400: invalid date range
+            404: unknown format
+            501: format requires not installed pyarrow
+    """
+
+    content_types = dict(
+        csv='text/csv',
+        arrow='application/vnd.apache.arrow.stream',
+        parquet='application/vnd.apache.parquet'
+    )
+
+    if extension not in content_types:
+        raise Http404(f"unknown export format: {extension}")
+
+    try:
+        date_from, date_to = get_date_range(request)
+    except ValueError:
+        return JsonResponse(status=status.HTTP_400_BAD_REQUEST, data={"detail": "from and to must be dates in YYYY-MM-DD format"})
+
+    queryset = Order.objects.order_by('source_id', 'index_number')
+
+    if date_from is not None:
+        queryset = queryset.filter(delivery_date__gte=date_from)
+
+    if date_to is not None:
+        queryset = queryset.filter(delivery_date__lte=date_to)
+
+    if extension == 'csv':
+        export = export_csv
+    else:
+        if find_spec('pyarrow') is None:
+            return JsonResponse(status=status.HTTP_501_NOT_IMPLEMENTED, data={"detail": "pyarrow is not installed"})
+
+        export = partial(export_arrow, parquet=(extension == 'parquet'))
+
+    filename = f'orders.{extension}'
+
+    if settings.SHEETS_ASYNC_VIEWS:
+        file = spooled_file()
+        export(queryset, file)
+        file.seek(0)
+
+        return FileResponse(file, as_attachment=True, filename=filename, content_type=content_types[extension])
+
+    return StreamingHttpResponse(
+        iter_export(export, queryset),
+        content_type=content_types[extension],
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
 
 # ------------------------- #
 
 def get_accum_price_in_time(currency: str) -> Dict[str, str]:
     """
-    Calculate accumulated price in time for specified currency.
+    Get accumulated price in time for specified currency from daily totals.
 
     Args:
         currency (str): currency code in ISO-3 format (USD or RUB)
@@ -46,17 +265,14 @@ def get_accum_price_in_time(currency: str) -> Dict[str, str]:
 
     assert currency in ["USD", "RUB"]
 
-    queryset = (Order.objects
-        .values('delivery_date')
+    queryset = (DailyTotal.objects
         .order_by('delivery_date')
-        .annotate(total=Sum(f"price_{currency}"))
+        .values_list('delivery_date', f"price_{currency}")
     )
 
-    result = tuple(queryset)
-
-    result = dict( 
-        (x['delivery_date'].strftime('%d.%m.%Y'), float(x['total']))
-        for x in result
+    result = dict(
+        (delivery_date.strftime('%d.%m.%Y'), float(total))
+        for delivery_date, total in queryset
     )
 
     return result
@@ -76,13 +292,147 @@ def get_total_price(currency: str) -> float:
 
     assert currency in ["USD", "RUB"]
 
-    queryset = Order.objects.aggregate(Sum(f'price_{currency}'))
+    queryset = DailyTotal.objects.aggregate(Sum(f'price_{currency}'))
     total = queryset[f'price_{currency}__sum']
 
     return total
 
 # ------------------------- #
 
+def get_running_price(
+        currency: str,
+        granularity: str = 'day',
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None
+    ) -> Dict[str, float]:
+    """
+    Calculate running (cumulative since the first order) total price by day, week or month
+    for specified currency within optional delivery date range using daily totals.
+
+    Args:
+        currency (str): currency code in ISO-3 format (USD or RUB)
+        granularity (str, optional): bucket size (day, week or month). Defaults to 'day'.
+        date_from (Optional[date], optional): first delivery date (inclusive). Defaults to None.
+        date_to (Optional[date], optional): last delivery date (inclusive). Defaults to None.
+
+    Returns:
+        Dict[str, float]: running totals by bucket start date, sorted chronologically
+    """
+
+    assert currency in ["USD", "RUB"]
+    assert granularity in GRANULARITY_BUCKETS
+
+    field = f"price_{currency}"
+    queryset = DailyTotal.objects.all()
+    running = Decimal(0)
+
+    # total before the range is the base of running total
+
+    if date_from is not None:
+        running = queryset.filter(delivery_date__lt=date_from).aggregate(total=Sum(field))['total'] or running
+        queryset = queryset.filter(delivery_date__gte=date_from)
+
+    if date_to is not None:
+        queryset = queryset.filter(delivery_date__lte=date_to)
+
+    queryset = (queryset
+        .annotate(bucket=GRANULARITY_BUCKETS[granularity])
+        .values('bucket')
+        .order_by('bucket')
+        .annotate(total=Sum(field))
+    )
+
+    result = dict()
+
+    for row in queryset:
+        running += row['total']
+        result[row['bucket'].strftime('%d.%m.%Y')] = float(running)
+
+    return result
+
+# ------------------------- #
+
+def parse_aggregate_params(request: HttpRequest) -> Tuple[str, str, Optional[date], Optional[date]]:
+    """
+    Parse `currency`, optional `granularity` (defaults to day), `from` and `to` query parameters.
+
+    Raises:
+        ValueError: invalid parameters
+
+    Returns:
+        Tuple[str, str, Optional[date], Optional[date]]: currency code, granularity, first and last delivery dates
+    """
+
+    currency = request.GET.get('currency', '').upper()
+    granularity = request.GET.get('granularity', 'day')
+
+    if currency not in ["USD", "RUB"]:
+        raise ValueError("currency must be usd or rub")
+
+    if granularity not in GRANULARITY_BUCKETS:
+        raise ValueError("granularity must be day, week or month")
+
+    try:
+        date_from, date_to = get_date_range(request)
+    except ValueError:
+        raise ValueError("from and to must be dates in YYYY-MM-DD format")
+
+    return currency, granularity, date_from, date_to
+
+# ------------------------- #
+
+@cached_view
+@api_view(http_method_names=['GET'])
+def get_aggregate_price(request: Request) -> Response:
+    """
+    Get running total price for `currency` (usd or rub) by `granularity` (day, week or month)
+    within optional `from` and `to` delivery dates.
+
+    Returns:
+        Response:
+            200: running total price by bucket start date
+            400: invalid parameters
+    """
+
+    try:
+        params = parse_aggregate_params(request)
+    except ValueError as error:
+        return Response(status=status.HTTP_400_BAD_REQUEST, data={"detail": str(error)})
+
+    data = get_running_price(*params)
+
+    return Response(status=status.HTTP_200_OK, data=data)
+
+# ------------------------- #
+
+@api_view(http_method_names=['POST'])
+def trigger_sync(request: Request) -> Response:
+    """
+    Enqueue debounced sync of `sheet` (defaults to kanalservis-test) on change notification
+    from Apps Script trigger or Google Drive push channel, bursts of notifications are coalesced.
+
+    Returns:
+        Response:
+            202: sync enqueued or already pending
+            403: invalid token
+            404: sheet is not registered or disabled
+    """
+
+    if not is_authorized_trigger(request):
+        return Response(status=status.HTTP_403_FORBIDDEN, data={"detail": "invalid token"})
+
+    sheet_name = request.query_params.get('sheet', 'kanalservis-test')
+
+    if not SheetSource.objects.filter(name=sheet_name, enabled=True).exists():
+        return Response(status=status.HTTP_404_NOT_FOUND, data={"detail": f"unknown sheet: {sheet_name}"})
+
+    queued = request_sync(sheet_name)
+
+    return Response(status=status.HTTP_202_ACCEPTED, data={"queued": queued})
+
+# ------------------------- #
+
+@cached_view
 @api_view(http_method_names=['GET'])
 def get_accum_price_usd_in_time(request: Request) -> Response:
     """
@@ -99,6 +449,7 @@ def get_accum_price_usd_in_time(request: Request) -> Response:
 
 # ------------------------- #
 
+@cached_view
 @api_view(http_method_names=['GET'])
 def get_accum_price_rub_in_time(request: Request) -> Response:
     """
@@ -115,6 +466,7 @@ def get_accum_price_rub_in_time(request: Request) -> Response:
 
 # ------------------------- #
 
+@cached_view
 @api_view(http_method_names=['GET'])
 def get_total_price_usd(request: Request) -> Response:
     """
@@ -131,6 +483,7 @@ def get_total_price_usd(request: Request) -> Response:
 
 # ------------------------- #
 
+@cached_view
 @api_view(http_method_names=['GET'])
 def get_total_price_rub(request: Request) -> Response:
     """
@@ -143,4 +496,178 @@ def get_total_price_rub(request: Request) -> Response:
 
     total = get_total_price("RUB")
 
-    return Response(status=status.HTTP_200_OK, data={"total" : total})
\ No newline at end of file
+    return Response(status=status.HTTP_200_OK, data={"total" : total})
+
+# ------------------------- #
+
+# ORM calls of async views are run by this pool (database connection per thread)
+_db_executor = ThreadPoolExecutor(max_workers=settings.SHEETS_ASYNC_DB_THREADS, thread_name_prefix='orm')
+
+# ------------------------- #
+
+async def run_query(func: Callable[..., Any], *args) -> Any:
+    """
+    Run blocking ORM call of async view in database thread pool,
+    broken and expired connections of the thread are closed beforehand,
+    queries are accounted to the stats of the request.
+
+    Args:
+        func (Callable[..., Any]): function querying database
+
+    Returns:
+        Any: function result
+    """
+
+    def call() -> Any:
+        close_old_connections()
+
+        with track_queries():
+            return func(*args)
+
+    return await sync_to_async(call, thread_sensitive=False, executor=_db_executor)()
+
+# ------------------------- #
+
+def require_GET_async(view: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Allow only GET requests to async view.
+
+    Args:
+        view (Callable[..., Any]): async view
+
+    Returns:
+        Callable[..., Any]: async view returning 405 for other methods
+    """
+
+    @wraps(view)
+    async def wrapper(request: HttpRequest, *args, **kwargs) -> HttpResponse:
+        if request.method != 'GET':
+            return HttpResponseNotAllowed(['GET'])
+
+        return await view(request, *args, **kwargs)
+
+    return wrapper
+
+# ------------------------- #
+
+@cached_view
+@require_GET_async
+async def get_all_orders_async(request: HttpRequest) -> HttpResponse:
+    """
+    Async version of `get_all_orders`.
+
+    Returns:
+        HttpResponse:
+            200: all objects from Order table or single page
+            400: invalid pagination parameters
+    """
+
+    if 'limit' not in request.GET:
+        content = await run_query(lambda: dump_json(list(iter_order_rows(Order.objects.all()))))
+
+        return HttpResponse(content, status=status.HTTP_200_OK, content_type='application/json')
+
+    try:
+        limit, after = parse_page(request)
+    except ValueError as error:
+        return JsonResponse(status=status.HTTP_400_BAD_REQUEST, data={"detail": str(error)})
+
+    content = await run_query(lambda: dump_json(get_orders_page(limit, after)))
+
+    return HttpResponse(content, status=status.HTTP_200_OK, content_type='application/json')
+
+# ------------------------- #
+
+@require_GET_async
+async def stream_all_orders_async(request: HttpRequest) -> FileResponse:
+    """
+    Async version of `stream_all_orders`.
+
+    ASGI handler of Django 4.0 iterates streaming content inside event loop
+    where database access is not allowed, so the array is encoded in thread pool
+    into spooled temporary file first, and the file is streamed.
+
+    Returns:
+        FileResponse:
+            200: all objects from Order table
+    """
+
+    def encode() -> IO[bytes]:
+        file = spooled_file()
+        file.writelines(iter_orders_json())
+        file.seek(0)
+
+        return file
+
+    file = await run_query(encode)
+
+    return FileResponse(file, content_type='application/json')
+
+# ------------------------- #
+
+@cached_view
+@require_GET_async
+async def get_aggregate_price_async(request: HttpRequest) -> HttpResponse:
+    """
+    Async version of `get_aggregate_price`.
+
+    Returns:
+        HttpResponse:
+            200: running total price by bucket start date
+            400: invalid parameters
+    """
+
+    try:
+        params = parse_aggregate_params(request)
+    except ValueError as error:
+        return JsonResponse(status=status.HTTP_400_BAD_REQUEST, data={"detail": str(error)})
+
+    data = await run_query(get_running_price, *params)
+
+    return HttpResponse(dump_json(data), status=status.HTTP_200_OK, content_type='application/json')
+
+# ------------------------- #
+
+@cached_view
+@require_GET_async
+async def get_accum_price_in_time_async(request: HttpRequest, currency: str) -> HttpResponse:
+    """
+    Async version of `get_accum_price_usd_in_time` and `get_accum_price_rub_in_time`.
+
+    Args:
+        currency (str): currency code in ISO-3 format (USD or RUB)
+
+    Returns:
+        HttpResponse:
+            200: accumulated price in time for the currency
+    """
+
+    data = await run_query(get_accum_price_in_time, currency)
+
+    return HttpResponse(dump_json(data), status=status.HTTP_200_OK, content_type='application/json')
+
+# ------------------------- #
+
+@cached_view
+@require_GET_async
+async def get_total_price_async(request: HttpRequest, currency: str) -> HttpResponse:
+    """
+    Async version of `get_total_price_usd` and `get_total_price_rub`.
+
+    Args:
+        currency (str): currency code in ISO-3 format (USD or RUB)
+
+    Returns:
+        HttpResponse:
+            200: total price for the currency
+    """
+
+    total = await run_query(get_total_price, currency)
+
+    # Decimal is encoded as number like DRF JSON renderer does
+    if total is not None:
+        total = float(total)
+
+    return HttpResponse(dump_json({"total" : total}), status=status.HTTP_200_OK, content_type='application/json')
+
+# ------------------------- #
@@ -0,0 +1,22 @@
+"""Gunicorn *production* config file (ASGI, uvicorn workers)"""
+
+import multiprocessing
+import os
+
+# Django ASGI application path in pattern MODULE_NAME:VARIABLE_NAME
+wsgi_app = "backend.asgi:application"
+# Event loop worker serving many concurrent requests per process
+worker_class = "uvicorn.workers.UvicornWorker"
+# The granularity of Error log outputs
+loglevel = "info"
+# The number of worker processes for handling requests
+workers = int(os.environ.get("GUNICORN_WORKERS", multiprocessing.cpu_count()))
+# The socket to bind
+bind = "0.0.0.0:8000"
+# Keep client connections of dashboards polling the API open between requests
+keepalive = 5
+# Restart workers periodically to limit memory growth
+max_requests = 10000
+max_requests_jitter = 1000
+# Redirect stdout/stderr to log file
+capture_output = True